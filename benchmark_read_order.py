@@ -0,0 +1,123 @@
+""" A regression benchmark for MpmeFileManager.read_order: it makes up
+    folders of 10,000 and 100,000 entries (with order files that leave
+    some entries out, list some that don't exist, and list some twice),
+    times the current way of sorting them and the old one, and makes sure
+    both come out in the same order. (The old way is quadratic, so by
+    default it's skipped for folders over 20,000 entries; pass a bigger
+    --old-limit to run it anyway.) For example,
+        python benchmark_read_order.py
+        python benchmark_read_order.py --sizes 1000 50000 --old-limit 50000 """
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from mpme_file_manager import MpmeFileManager
+
+def old_read_order(folder_list, folder):
+    """ The way read_order used to sort a listing: for each name in
+        the order file, find it in the listing and move it up. """
+    try:
+        file_object = open(os.path.join(folder,
+            MpmeFileManager.ORDER_FILE_NAME), 'r')
+    except IOError:
+        return ''
+
+    writing_index = 0
+    file_or_folder_name = file_object.readline().strip()
+    while file_or_folder_name != "":
+        index_of_fof = MpmeFileManager.file_index(
+            folder_list, file_or_folder_name, writing_index)
+        if index_of_fof != -1:
+            element_we_want = folder_list.pop(index_of_fof)
+            folder_list.insert(writing_index, element_we_want)
+            writing_index = writing_index + 1
+        file_or_folder_name = file_object.readline().strip()
+    file_object.close()
+
+def make_folder(size, generator):
+    """ Return a made-up listing of the given size and the lines of an
+        order file for it, which lists most of the entries (shuffled),
+        some of them twice, and some names that aren't in the listing. """
+    listing = []
+    for index in range(size):
+        if generator.random() < 0.1:
+            listing.append(MpmeFileManager.FOLDER_ICON + "Folder %d" % index)
+        else:
+            listing.append(MpmeFileManager.MUSIC_ICON + "Song %d.mp3" % index)
+    names = [MpmeFileManager.filename_portion(item) for item in listing]
+    # Leave about a tenth of the entries out of the order (unlisted)...
+    order = [name for name in names if generator.random() >= 0.1]
+    # ...and list about a twentieth of them twice...
+    order = order + generator.sample(order, len(order) // 20)
+    # ...and throw in names that aren't in the folder (missing).
+    order = order + ["Gone %d.mp3" % index for index in range(size // 20)]
+    generator.shuffle(order)
+    return listing, order
+
+def write_order_file(folder, lines):
+    """ Write an order file with the given lines into the folder. """
+    with open(os.path.join(folder, MpmeFileManager.ORDER_FILE_NAME),
+              'w') as file_object:
+        for line in lines:
+            file_object.write(line + '\n')
+
+def time_sort(read_order, listing, folder):
+    """ Sort a copy of the listing with the given function and return
+        the sorted listing and how long it took (in seconds). """
+    folder_list = list(listing)
+    started = time.perf_counter()
+    read_order(folder_list, folder)
+    return folder_list, time.perf_counter() - started
+
+def check_small_folders(folder, generator, count):
+    """ Make sure both ways agree on lots of small folders, including
+        ones whose order file is empty, ends early with a blank line,
+        or lists nothing but names that aren't there. """
+    for _ in range(count):
+        listing, order = make_folder(generator.randint(0, 30), generator)
+        choice = generator.random()
+        if choice < 0.1:
+            order = []
+        elif choice < 0.2 and order:
+            order.insert(generator.randrange(len(order)), "")
+        elif choice < 0.3:
+            order = ["Gone %d.mp3" % index for index in range(5)]
+        write_order_file(folder, order)
+        new_list = time_sort(MpmeFileManager.read_order, listing, folder)[0]
+        old_list = time_sort(old_read_order, listing, folder)[0]
+        assert new_list == old_list, (listing, order)
+
+def main():
+    """ Run the benchmark. """
+    parser = argparse.ArgumentParser(
+        description="Time read_order against the old way of sorting.")
+    parser.add_argument("--sizes", type=int, nargs="+",
+                        default=[10000, 100000],
+                        help="how many entries the made-up folders have")
+    parser.add_argument("--old-limit", type=int, default=20000,
+                        help="the largest folder to sort the old way (it's "
+                        "quadratic, so 100,000 entries take many minutes)")
+    parser.add_argument("--seed", type=int, default=0)
+    arguments = parser.parse_args()
+    generator = random.Random(arguments.seed)
+    with tempfile.TemporaryDirectory() as folder:
+        check_small_folders(folder, generator, 500)
+        print("500 small folders sorted the same both ways.")
+        for size in arguments.sizes:
+            listing, order = make_folder(size, generator)
+            write_order_file(folder, order)
+            new_list, new_time = time_sort(MpmeFileManager.read_order,
+                                           listing, folder)
+            if size > arguments.old_limit:
+                print("%7d entries: new %8.3f s, old skipped (over the "
+                      "--old-limit)" % (size, new_time))
+                continue
+            old_list, old_time = time_sort(old_read_order, listing, folder)
+            assert new_list == old_list, "The orders differ at %d." % size
+            print("%7d entries: new %8.3f s, old %8.3f s, same order" %
+                  (size, new_time, old_time))
+
+if __name__ == '__main__':
+    main()
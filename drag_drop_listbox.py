@@ -12,6 +12,8 @@ class DragDropListbox(tk.Listbox):
         self.bind('<B1-Motion>', self.shiftSelection)
         self.bind('<ButtonRelease-1>', self.checkForClick)
         self.curIndex = None
+        # Whether the user moved anything since the list was last saved
+        self.order_changed = False
         self.file_display = file_display
 
     def setCurrent(self, event):
@@ -28,11 +30,13 @@ class DragDropListbox(tk.Listbox):
             self.delete(i)
             self.insert(i+1, x)
             self.curIndex = i
+            self.order_changed = True
         elif i > self.curIndex:
             x = self.get(i)
             self.delete(i)
             self.insert(i-1, x)
             self.curIndex = i
+            self.order_changed = True
 
     def checkForClick(self, event):
         """ See if the user left-clicked the mouse AND LET GO OF THE
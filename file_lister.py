@@ -1,8 +1,13 @@
 import tkinter as tk
-import drag_drop_listbox
+import virtual_listbox
 import os
+import threading
 from mpme_constants import MpmeConstants
 from mpme_file_manager import *
+from mpme_library_index import MpmeLibraryIndex
+from mpme_listing_cache import MpmeListingCache
+from mpme_folder_watcher import MpmeFolderWatcher
+from mpme_play_order import MpmePlayOrder
 
 class FileLister():
     """ Class to display the files and sub-folders
@@ -13,6 +18,22 @@ class FileLister():
         self.ROOT_FOLDER = MpmeConstants.ROOT_FOLDER + \
             MpmeConstants.FOLDER_VIEW
         self.frm = frm
+        # The folder being shown. (We keep track of it ourselves instead
+        # of changing the process's current directory, so work on other
+        # threads never has the directory changed out from under it.)
+        self.current_path = os.path.abspath(self.ROOT_FOLDER)
+
+        # The index of the folder view, so we don't have to
+        # ask the file system about every file every time.
+        self.library = MpmeLibraryIndex()
+
+        # The most recently visited folders, already sorted
+        self.listing_cache = MpmeListingCache(
+            MpmeConstants.LISTING_CACHE_ENTRIES,
+            MpmeConstants.LISTING_CACHE_BYTES)
+
+        # The order in which all the songs get played, one after another
+        self.play_order = MpmePlayOrder(self)
 
         # The scrollbar
         scrollbar = tk.Scrollbar(frm, orient="vertical")
@@ -20,20 +41,31 @@ class FileLister():
                        columnspan=1, sticky='ns')
 
         # Create the listbox (with drag 'n' drop capability).
-        self.playlist = drag_drop_listbox.DragDropListbox(
+        self.playlist = virtual_listbox.VirtualListbox(
             frm, self, width=45, yscrollcommand=scrollbar.set)
         self.playlist.grid(row=row, rowspan=rowspan, column=1,
                            columnspan=columnspan-1)
         scrollbar.config(command=self.playlist.yview)
         self.get_list(self.ROOT_FOLDER)
 
+        # Watch the folder view for files being added or deleted. The
+        # watcher reports from its own thread, so just collect the changed
+        # folders there and deal with them here in the main loop.
+        self.changed_folders = set()
+        self.changed_folders_lock = threading.Lock()
+        self.watcher = MpmeFolderWatcher(self.ROOT_FOLDER,
+            self.folder_changed, MpmeConstants.WATCH_POLL_INTERVAL)
+        self.frm.after(MpmeConstants.WATCH_CHECK_MS, self.check_for_changes)
+
     def click_line(self):
         """ Respond to a user clicking on a line without dragging
             it - that is, change directories if it's a folder
             or play the sound file if it's a file. """
         # (But first write the order of the current folder.)
         self.write_order()
-        entry_reading = self.playlist.get(self.playlist.curselection()[0])
+        entry_reading = self.playlist.selected_entry()
+        if entry_reading is None:
+            return # The user clicked below the last entry.
         entry_name = entry_reading[len(MpmeFileManager.FOLDER_ICON):]
         if entry_reading.startswith(MpmeFileManager.FOLDER_ICON):
             self.get_list(entry_name)
@@ -42,43 +74,109 @@ class FileLister():
             self.frm.play(entry_name)
 
     def write_order(self):
-        """ Write the file with the order within the folder. """
-        MpmeFileManager.write_order(self.playlist.get(0, tk.END))
+        """ Write the file with the order within the folder
+            (but only if the user actually rearranged it). """
+        if not self.playlist.order_changed:
+            return
+        MpmeFileManager.write_order(self.playlist.get_rows(),
+                                    self.current_path)
+        # (We take care of the folder's changed order right here, so the
+        # watcher needn't report it.)
+        self.watcher.ignore_own_change(self.current_path)
+        self.listing_cache.invalidate(self.current_path)
+        self.playlist.order_changed = False
+        # The play order has to follow the new order, and
+        # so does whichever song is lined up to play next.
+        self.play_order.invalidate(self.current_path)
+        self.frm.queue_next()
+
+    def resolve_path(self, path):
+        """ Return the complete path of a folder given
+            relative to the folder being shown. """
+        return os.path.abspath(os.path.join(self.current_path, path))
 
     def get_nonvisual_list(self, path):
         """ Return a list of files and folders in the given folder. """
-        folder_listing = []
-        # Change the directory.
-        os.chdir(path)
-        # Now get the new (current) complete path in a string.
-        current_path = self.trim_off_drive(os.getcwd())
-        # List the folders and files in the directory.
-        for f in os.listdir(current_path):
-            if os.path.isfile(f):
-                if (self.acceptable_file(f)):
-                    folder_listing.append(MpmeFileManager.MUSIC_ICON + f)
-            else: # It must be a folder.
-                folder_listing.append(MpmeFileManager.FOLDER_ICON + f)
-        # Sort the folders and files into the
-        # order the user previously specified.
-        MpmeFileManager.read_order(folder_listing)
+        # Get the complete path of the folder.
+        folder = self.resolve_path(path)
+        # If we listed the folder recently and it hasn't
+        # changed since, just use that listing again.
+        stamp = self.listing_cache.stamp(folder)
+        folder_listing = self.listing_cache.get(folder, stamp)
+        if folder_listing is None:
+            folder_listing = []
+            # List the folders and files in the directory.
+            for f, is_file in self.library.listing(folder):
+                if is_file:
+                    if (self.acceptable_file(f)):
+                        folder_listing.append(MpmeFileManager.MUSIC_ICON + f)
+                else: # It must be a folder.
+                    folder_listing.append(MpmeFileManager.FOLDER_ICON + f)
+            # Sort the folders and files into the
+            # order the user previously specified.
+            MpmeFileManager.read_order(folder_listing, folder)
+            self.listing_cache.put(folder, stamp, folder_listing)
+        # (Copy the listing so the cached one stays as it is.)
+        folder_listing = list(folder_listing)
         # If it's not the official root...
-        if current_path != self.ROOT_FOLDER:
+        if MpmeLibraryIndex.key(folder) != \
+           MpmeLibraryIndex.key(os.path.abspath(self.ROOT_FOLDER)):
             # ...then add a line to go up to the parent folder.
             folder_listing.insert(0, MpmeFileManager.FOLDER_ICON + "..")
         return folder_listing
+
     def get_list(self, path):
         """ Get a list of the files and folders and
             populate the listbox with them. """
         folder_listing = self.get_nonvisual_list(path)
-        # Clear the listbox of any existing content.
-        self.playlist.delete(0, tk.END)
-        # Insert the folders and files into the listbox.
-        for item in folder_listing:
-            self.playlist.insert(tk.END, item)
+        self.current_path = self.resolve_path(path)
+        # Put the folders and files into the listbox all at once.
+        self.playlist.set_rows(folder_listing)
+
+    def folder_changed(self, folder):
+        """ Note that files or folders were added to or
+            deleted from a folder. (This runs in the watcher.) """
+        with self.changed_folders_lock:
+            self.changed_folders.add(folder)
+
+    def check_for_changes(self):
+        """ Bring everything up to date with
+            the folders that changed, if any. """
+        with self.changed_folders_lock:
+            changed_folders = self.changed_folders
+            self.changed_folders = set()
+        for folder in changed_folders:
+            # Make sure the folder gets listed afresh next time.
+            self.listing_cache.invalidate(folder)
+            self.library.forget(MpmeLibraryIndex.key(folder))
+            self.play_order.invalidate(folder)
+        current_key = MpmeLibraryIndex.key(self.current_path)
+        if any(MpmeLibraryIndex.key(folder) == current_key
+               for folder in changed_folders):
+            self.refresh_list()
+        self.frm.after(MpmeConstants.WATCH_CHECK_MS, self.check_for_changes)
+
+    def refresh_list(self):
+        """ Update the listbox for the folder being shown by removing the
+            entries that are gone and inserting the new ones, so the user's
+            place in the list (and any unsaved rearranging) is kept. """
+        if not os.path.isdir(self.current_path):
+            # The folder itself is gone, so go back to the top.
+            self.get_list(self.ROOT_FOLDER)
+            return
+        folder_listing = self.get_nonvisual_list(self.current_path)
+        new_entries = set(folder_listing)
+        old_entries = self.playlist.get_rows()
+        entries = [entry for entry in old_entries if entry in new_entries]
+        old_entries = set(old_entries)
+        for index in range(len(folder_listing)):
+            if folder_listing[index] not in old_entries:
+                entries.insert(index, folder_listing[index])
+        self.playlist.update_rows(entries)
 
     def get_current_path(self):
-        return os.getcwd()
+        """ Return the complete path of the folder being shown. """
+        return self.current_path
 
     def next_file(self, current_path, current_file):
         """ Given a file in a folder given in a path navigate to the next
@@ -87,61 +185,30 @@ class FileLister():
         # (But first write the order of the current
         # folder in case we navigate out of it.)
         self.write_order()
-        
-        # Start by determining the initial values.
-        path_iteration = current_path
-        folder_list = self.get_nonvisual_list(path_iteration)
-        # Find which element in the list is the current song.
-        file_index = MpmeFileManager.file_index(folder_list, current_file)
-        # What would cause an error to return a -1? Could the file have been
-        # deleted while playing? Is that possible? Could the files have been
-        # corrupted? I don't know. What the heck; in such a case the file
-        # index will get incremented to 0, the first element in the list.
-
-        # Now loop until we find the right file.
-        while True:
-            file_index = file_index + 1
-            if file_index >= len(folder_list):
-                file_index = 0
-            filename_portion = MpmeFileManager.filename_portion(
-                folder_list[file_index])
-            if MpmeFileManager.is_folder(folder_list[file_index]):
-                # Change current path to the folder.
-                current_folder = MpmeFileManager.folder_name(path_iteration)
-                folder_list = self.get_nonvisual_list(filename_portion)
-                if filename_portion == "..":
-                    # Find the index of the folder from which we're emerging.
-                    file_index = MpmeFileManager.file_index(
-                        folder_list, current_folder)
-                else:
-                    # Start at the beginning of the listing in that folder.
-                    file_index = 0 # ...so the loop will increment
-                    # it to 1, the first item that isn't "..".
-                path_iteration = os.getcwd()
-            else: # Assume it's a valid sound file; we found our answer!
-                self.get_list(path_iteration)
-                #self.playlist.select_clear(0, self.playlist.size() - 1)
-                self.playlist.select_set(file_index)
-                sound_file = MpmeFileManager.filename_portion(
-                     self.playlist.get(file_index))
-                return(sound_file)
 
+        # Look up the next song in the play order.
+        next_track = self.play_order.next_track(current_path, current_file)
+        if next_track is None:
+            # There are no songs anywhere in the folder view.
+            return None
+        return self.show_track(next_track)
+
+    def show_track(self, track):
+        """ Given a song from the play order, show its folder (unless it's
+            already showing), select it, and return its filename. """
+        folder, sound_file, row = track
+        if MpmeLibraryIndex.key(folder) != \
+           MpmeLibraryIndex.key(self.get_current_path()):
+            self.get_list(folder)
+        self.playlist.select_row(row)
+        return(sound_file)
 
-    @staticmethod
-    def trim_off_drive(path):
-        """ Given a string that's a path, trim off the leading drive. """
-        index = path.find(":")
-        if index >= 0:
-            return path[index+1:]
-        else:
-            return path
-        
     @staticmethod
     def acceptable_file(file_name):
         """ Determine if a file is of an acceptable file type."""
-        # Originally we allowed .wav files as well as .mp3 but the
-        # pygame.mixer.music.set_pos() method doesn't work with .wav files.
-        if file_name.endswith(".mp3"):
+        # (The mixer can't jump around in .wav files, but we play
+        # them ourselves, straight from their samples.)
+        if file_name.endswith((".mp3", ".wav")):
             return True
         else:
             return False
@@ -1,3 +1,10 @@
+import time
+# Take note of when we started, for measuring how long it takes
+# the window to come up (before all the other imports, which
+# are part of that time).
+STARTED = time.perf_counter()
+import os
+import sys
 import tkinter as tk
 from file_lister import FileLister
 from position_slider import PositionSlider
@@ -6,11 +13,16 @@ from radio_volume_slider import RadioVolumeSlider
 from radio_freq_slider import RadioFreqSlider
 from mpme_sound import MpmeSound
 from time_display import TimeDisplay
-from repeated_timer import RepeatedTimer
+from mpme_scheduler import MpmeScheduler
+from mpme_ui_queue import MpmeUiQueue
 from mpme_settings import MpmeSettings
 from text_field import TextField
 from radio_receiver import RadioReceiver
+from mpme_stream_client import MpmeStreamClient
 from mpme_file_manager import MpmeFileManager
+from mpme_metadata_cache import MpmeMetadataCache
+from mpme_library_scanner import MpmeLibraryScanner
+from mpme_constants import MpmeConstants
 
 class Mpme(tk.Tk):
     """ The window class """
@@ -29,50 +41,105 @@ class Mpme(tk.Tk):
         # Check that the necessary folders are there; if not, create them.
         MpmeFileManager.initialize_folders()
         
+        # Create the scheduler that runs all the pages' timers, and the
+        # queue through which they (and other threads) update the widgets.
+        self.scheduler = MpmeScheduler()
+        self.ui_queue = MpmeUiQueue(self, MpmeConstants.UI_QUEUE_MS)
+
         # Create an object for holding the settings.
-        self.settings_object = MpmeSettings()
+        self.settings_object = MpmeSettings(self.scheduler)
  
+        # Create the cache of the songs' lengths and such.
+        self.metadata_cache = MpmeMetadataCache()
+
         # Create the sound file (nonvisual) object.
-        self.sound_object = MpmeSound(self.settings_object.get_settings())
+        self.sound_object = MpmeSound(self.settings_object.get_settings(),
+                                      self.metadata_cache)
 
         # this container contains all the pages
-        container = tk.Frame(self)
-        container.pack(side='top', fill='both', expand=True)
+        self.container = tk.Frame(self)
+        self.container.pack(side='top', fill='both', expand=True)
         # Make the cell in the grid cover the entire window.
-        container.grid_rowconfigure(0, weight=1)
-        container.grid_columnconfigure(0, weight=1)
+        self.container.grid_rowconfigure(0, weight=1)
+        self.container.grid_columnconfigure(0, weight=1)
         self.frames = {} # These are pages to which we want to navigate.
 
-        # For each page...
-        for F in (MpmeStartPage, MpmeFolderPage,
-                  MpmeSettingsPage, MpmeRadioPage):
-            # ...create the page...
-            frame = F(container, self)
+        # In a fast start, the audio gets started when the first song plays
+        # and each page gets built the first time it's shown; otherwise,
+        # do it all now.
+        self.fast_start = self.settings_object.get_fast_start()
+        if not self.fast_start:
+            self.sound_object.start_audio()
+            for F in (MpmeStartPage, MpmeFolderPage,
+                      MpmeSettingsPage, MpmeRadioPage):
+                self.page(F)
+
+        # The first page is StartPage.
+        self.show_frame(MpmeStartPage)
+
+        # Measure how long it took for the window to come
+        # up, and then get on with the work in the background.
+        self.startup_time = None
+        self.library_scanner = None
+        self.bind('<Map>', self.first_shown)
+
+    def first_shown(self, event):
+        """ Once the window first comes up, take note of how long that took
+            and start reading the details of all the songs. """
+        if event.widget is not self:
+            return # (The other widgets' windows come up too.)
+        self.unbind('<Map>')
+        self.startup_time = time.perf_counter() - STARTED
+        if '--startup-time' in sys.argv:
+            print("The window came up in {:.3f} seconds.".
+                  format(self.startup_time))
+        # Read the details of all the songs in the background.
+        self.library_scanner = MpmeLibraryScanner(
+            MpmeConstants.ROOT_FOLDER + MpmeConstants.FOLDER_VIEW,
+            self.metadata_cache, MpmeConstants.SCANNER_WORKERS)
+
+    def page(self, name):
+        """ Return the page of the given class, building it if need be. """
+        if name not in self.frames:
+            # Create the page...
+            frame = name(self.container, self)
             # ...store it in a frame...
-            self.frames[F] = frame
+            self.frames[name] = frame
             # ..and position the page in the container.
             frame.grid(row=0, column=0, sticky='nsew')
+        return self.frames[name]
 
-        # The first page is StartPage.
-        self.show_frame(MpmeStartPage)
- 
     def show_frame(self, name):
         """ Show the frame, that is, the container for all the pages. """
-        self.frames[name].tkraise()
+        self.page(name).tkraise()
         # If the Radio page comes up, stop the MP3 file (if any) from playing.
         if name == MpmeRadioPage:
-            self.frames[MpmeFolderPage].stop()
+            if MpmeFolderPage in self.frames:
+                self.frames[MpmeFolderPage].stop()
             self.frames[MpmeRadioPage].start_reception()
         # If the Start page comes up, stop the radio (in case it's on).
-        elif name == MpmeStartPage:
+        elif name == MpmeStartPage and MpmeRadioPage in self.frames:
             self.frames[MpmeRadioPage].stop_reception()
 
     def on_closing(self):
         """ Before closing the window, save the order in case we're in the
-            Folder view and stop the song in case there's one playing. """
-        self.frames[MpmeFolderPage].file_display.write_order()
-        self.frames[MpmeFolderPage].stop()
-        self.frames[MpmeRadioPage].stop_reception()
+            Folder view and stop the song in case there's one playing.
+            (Pages that were never shown have nothing to clean up.) """
+        if MpmeFolderPage in self.frames:
+            self.frames[MpmeFolderPage].file_display.write_order()
+            self.frames[MpmeFolderPage].file_display.watcher.stop()
+            self.frames[MpmeFolderPage].stop()
+        if self.library_scanner is not None:
+            self.library_scanner.cancel()
+        if MpmeRadioPage in self.frames:
+            self.frames[MpmeRadioPage].stop_reception()
+        cache_stats = self.sound_object.cache_stats()
+        if '--cache-stats' in sys.argv and cache_stats is not None:
+            print("Song cache: {hits} hits, {misses} misses, {evictions} "
+                  "evictions; {songs} songs ({bytes} bytes) cached.".
+                  format(**cache_stats))
+        self.settings_object.close()
+        self.scheduler.stop()
         self.destroy()
 
 class MpmeStartPage(tk.Frame):
@@ -156,23 +223,28 @@ class MpmeFolderPage(tk.Frame):
         self.position_slider.grid(row=4, column=1, columnspan=4)
 
         # Create the time display.
-        self.current_time = TimeDisplay(self, 1)
+        self.current_time = TimeDisplay(self)
         # Specify the geometry to place the time display.
         self.current_time.grid(row=5, column=1)
 
         # Create the display for the song's total length.
-        self.total_time = TimeDisplay(self, 0)
+        self.total_time = TimeDisplay(self)
         # Specify the geometry to place the "total" time display.
         self.total_time.grid(row=5, column=2)
         
         # Create the display for the amount of time left.
-        self.time_left = TimeDisplay(self, -1)
+        self.time_left = TimeDisplay(self)
         # Specify the geometry to place the time-left display.
         self.time_left.grid(row=5, column=3)
 
-        # The following variable is to indicate if, while the song is
-        # paused, the user jumped to a different point in the song.
-        self.jump_pending = False
+        # Whether we're keeping an ear out for the mixer telling us that
+        # songs end (which we can only know once the audio is started)
+        self.checking_for_end = False
+
+        # How many times a song was started or stopped, so that a song's
+        # end, noticed in the scheduler's thread, isn't acted on if the
+        # main thread went on to another song (or stopped) meanwhile
+        self.generation = 0
 
     def save_and_start(self):
         """ Save the order and THEN return to the Start page. """
@@ -184,41 +256,70 @@ class MpmeFolderPage(tk.Frame):
         # (But first check if there's a timer
         # currently running and if so, stop it.)
         if hasattr(self, 'timer'):
-            self.timer.stop()
-        self.position_slider.set(0)
-        self.controller.sound_object.play(sound_file)
-        self.current_time.move_timer(0)
-        self.total_time.move_timer(self.controller.sound_object.get_length())
-        self.time_left.move_timer(self.controller.sound_object.get_length())
-        self.timer = RepeatedTimer(1, self.increment_timers)
+            self.timer.cancel()
+        self.generation = self.generation + 1
+        self.controller.sound_object.play(os.path.join(
+            self.file_display.get_current_path(), sound_file))
+        # If the mixer tells us when songs end, keep an ear out for that.
+        if not self.checking_for_end and \
+           self.controller.sound_object.has_end_event():
+            self.checking_for_end = True
+            self.after(MpmeConstants.END_EVENT_CHECK_MS, self.check_for_end)
+        self.show_time()
+        self.timer = self.controller.scheduler.every(
+            MpmeConstants.POSITION_REFRESH_INTERVAL, self.refresh_position)
         self.button_pause["state"] = "normal"
         self.button_pause.config(relief=tk.RAISED)
         self.paused = False
         self.song_now_playing = sound_file
         self.path_now_playing = self.file_display.get_current_path()
+        self.queue_next()
+
+    def queue_next(self):
+        """ If we're playing songs without gaps in between, line up
+            the song after this one so it starts the moment this ends. """
+        if not self.controller.settings_object.get_gapless() or \
+           not self.button_pause["state"] == "normal":
+            # Gapless mode is off, or nothing is playing
+            # (in which case the Pause button is disabled).
+            return
+        track = self.file_display.play_order.next_track(
+            self.path_now_playing, self.song_now_playing)
+        if track is not None:
+            folder, sound_file, row = track
+            self.controller.sound_object.queue(
+                os.path.join(folder, sound_file))
+
+    def catch_up(self):
+        """ The song that was lined up just started,
+            so bring the page up to date with it. """
+        self.generation = self.generation + 1
+        self.path_now_playing, self.song_now_playing = os.path.split(
+            self.controller.sound_object.music_file_name)
+        # The songs may have been rearranged since it was lined up, so
+        # save that, and then find the song in the play order as it is
+        # now, so the row we select is the one it's in now.
+        self.file_display.write_order()
+        track = self.file_display.play_order.track_of(
+            self.path_now_playing, self.song_now_playing)
+        if track is not None:
+            self.file_display.show_track(track)
+        self.file_display.playlist.see_row(
+            self.file_display.playlist.selected_row())
+        self.show_time()
+        self.queue_next()
 
     def pause(self):
         """ Toggle between a "paused" and "non-paused" state. """
         if self.paused:
             self.button_pause.config(relief=tk.RAISED)
-            # Theoretically, if the user pauses and unpauses
-            # many times during the same song, the timers
-            # could get thrown off. So adjust the timers.
-            if not self.jump_pending:
-                self.current_time.move_timer(
-                    self.controller.sound_object.get_position())
-                self.time_left.move_timer(
-                    self.controller.sound_object.get_length() -
-                    self.controller.sound_object.get_position())
-                self.position_slider.set(self.current_time.timer_seconds /
-                    self.controller.sound_object.get_length() * 100)
-            self.jump_pending = False
             self.controller.sound_object.unpause()
-            self.timer = RepeatedTimer(1, self.increment_timers)
+            self.timer = self.controller.scheduler.every(
+                MpmeConstants.POSITION_REFRESH_INTERVAL, self.refresh_position)
         else:
             self.button_pause.config(relief=tk.SUNKEN)
             self.controller.sound_object.pause()
-            self.timer.stop()
+            self.timer.cancel()
         self.paused = not self.paused
 
     def stop(self):
@@ -227,28 +328,80 @@ class MpmeFolderPage(tk.Frame):
         self.button_pause.config(relief=tk.RAISED)
         self.paused = False
         self.button_pause["state"] = "disable"
-        self.jump_pending = False
         if hasattr(self, 'timer'):
-            self.timer.stop()
-
-    def increment_timers(self):
-        """ Add a seoond to the time, subtract a second from the time
-            left, and push the position slider forward in proportion. """
-        # (But first check if the song is over,
-        # in which case play the next song.)
-        if self.controller.sound_object.song_is_over():
-            # Stop the song, find the next song, and play it. 
-            self.play(self.file_display.next_file(
-                self.path_now_playing, self.song_now_playing))
-            # Scroll to the song so that it's visible.
-            self.file_display.playlist.see(
-                self.file_display.playlist.curselection())
+            self.timer.cancel()
+        self.generation = self.generation + 1
+
+    def refresh_position(self):
+        """ Show how far into the song we are. This runs in the
+            scheduler's thread, so it leaves the widgets to the main loop. """
+        # (Note which song this is before looking; see song_ended.)
+        generation = self.generation
+        # (But first, if the mixer can't tell us when the song is over,
+        # check for ourselves. Either the next song was lined up and
+        # already started playing...)
+        if not self.controller.sound_object.has_end_event() and \
+           self.controller.sound_object.advanced_to_queued():
+            self.controller.ui_queue.post('next song', self.catch_up)
+        # ...or we have to play it ourselves.
+        elif not self.controller.sound_object.has_end_event() and \
+             self.controller.sound_object.song_is_over():
+            self.controller.ui_queue.post('next song', self.song_ended,
+                                          generation)
         else:
-            self.current_time.increment()
-            self.time_left.increment()
-            self.position_slider.set(self.current_time.timer_seconds /
-                self.controller.sound_object.get_length() * 100)
+            self.show_time()
+
+    def song_ended(self, generation):
+        """ Play the next song, now that the scheduler's thread found the
+            song over - unless a song was started (or stopped) since it
+            looked, in which case what it found is out of date. """
+        if generation == self.generation:
+            self.play_next()
+
+    def show_time(self):
+        """ Show the time played, the song's total length (in case it was
+            just found) and the time left, and push the position slider
+            forward in proportion. (It's safe to call from any thread.) """
+        seconds = self.controller.sound_object.get_position()
+        length = self.controller.sound_object.get_length()
+        ui_queue = self.controller.ui_queue
+        ui_queue.post(self.current_time, self.current_time.move_timer, seconds)
+        ui_queue.post(self.total_time, self.total_time.move_timer, length)
+        ui_queue.post(self.time_left, self.time_left.move_timer,
+                      max(0, length - seconds))
+        if length > 0:
+            ui_queue.post(self.position_slider,
+                          self.position_slider.show_position,
+                          seconds / length * 100)
+        else:
+            ui_queue.post(self.position_slider,
+                          self.position_slider.show_position, 0)
    
+    def check_for_end(self):
+        """ If the mixer reported that the song ended, go on to the next
+            song right away; then check again in a few milliseconds. """
+        if self.controller.sound_object.end_of_song():
+            if self.controller.sound_object.queued_file_name is not None:
+                # The song that was lined up is already playing.
+                self.controller.sound_object.advance_to_queued()
+                self.catch_up()
+            else:
+                self.play_next()
+        self.after(MpmeConstants.END_EVENT_CHECK_MS, self.check_for_end)
+
+    def play_next(self):
+        """ Stop the song, find the next song, and play it. """
+        next_song = self.file_display.next_file(
+            self.path_now_playing, self.song_now_playing)
+        if next_song is None:
+            # The song must have been the last one left.
+            self.stop()
+            return
+        self.play(next_song)
+        # Scroll to the song so that it's visible.
+        self.file_display.playlist.see_row(
+            self.file_display.playlist.selected_row())
+
     def change_volume(self, volume):
         """ Change the song's audio volume. """
         self.controller.sound_object.set_volume(volume/100)
@@ -260,11 +413,7 @@ class MpmeFolderPage(tk.Frame):
         position_in_seconds = position_percentage * \
                 self.controller.sound_object.get_length() // 100
         self.controller.sound_object.set_position(position_in_seconds)
-        self.current_time.move_timer(position_in_seconds)
-        self.time_left.move_timer(self.controller.sound_object.get_length() -
-                                  position_in_seconds)
-        if self.paused:
-            self.jump_pending = True
+        self.show_time()
 
 class MpmeSettingsPage(tk.Frame):
     """ Class for the Settings page """
@@ -402,13 +551,15 @@ class MpmeSettingsPage(tk.Frame):
         validation_message = self.controller.settings_object.valid(
             requested_freq, requested_buffer)
         if validation_message == "": # No errors were found so far.
-            self.controller.frames[MpmeFolderPage].stop()
-            self.current_settings['freq'] = requested_freq
-            self.current_settings['channels'] = self.channels_value.get()
-            self.current_settings['buffer'] = requested_buffer
-            validation_message = \
-                self.controller.settings_object.save_settings(
-                    self.current_settings)
+            # (The song, if any, keeps playing; if the mixer has
+            # to start over, it picks up where it left off.)
+            settings_object = self.controller.settings_object
+            with settings_object.batch():
+                settings_object.change('freq', requested_freq)
+                settings_object.change('channels', self.channels_value.get())
+                settings_object.change('buffer', requested_buffer)
+            # Write them right away, so we can say if it worked.
+            validation_message = settings_object.save_settings()
             self.controller.sound_object.set_settings(self.current_settings)
         if validation_message == "":
             # Presumably the save went without errors.
@@ -445,6 +596,8 @@ class MpmeRadioPage(tk.Frame):
         self.controller = controller
         self.radio_freq_value = self.controller.settings_object.get_radio_freq()
         self.radio_volume = self.controller.settings_object.get_radio_volume()
+        # The stream playing from a preset, if any (instead of the radio)
+        self.stream = None
 
         # When the user clicks on this button, call the
         # show_frame method to make the main screen appear.
@@ -479,25 +632,30 @@ class MpmeRadioPage(tk.Frame):
                     command=lambda : self.scan(.1))
 
         # The preset buttons
-        preset_1 = tk.Button(self, text=self.controller.settings_object.
-            get_preset(1), command=lambda : self.preset(1))
-        preset_2 = tk.Button(self, text=self.controller.settings_object.
-            get_preset(2), command=lambda : self.preset(2))
-        preset_3 = tk.Button(self, text=self.controller.settings_object.
-            get_preset(3), command=lambda : self.preset(3))
-        preset_4 = tk.Button(self, text=self.controller.settings_object.
-            get_preset(4), command=lambda : self.preset(4))
-        preset_5 = tk.Button(self, text=self.controller.settings_object.
-            get_preset(5), command=lambda : self.preset(5))
-        preset_6 = tk.Button(self, text=self.controller.settings_object.
-            get_preset(6), command=lambda : self.preset(6))
-        preset_7 = tk.Button(self, text=self.controller.settings_object.
-            get_preset(7), command=lambda : self.preset(7))
-        preset_8 = tk.Button(self, text=self.controller.settings_object.
-            get_preset(8), command=lambda : self.preset(8))
+        preset_1 = tk.Button(self, text=self.preset_label(1),
+            command=lambda : self.preset(1))
+        preset_2 = tk.Button(self, text=self.preset_label(2),
+            command=lambda : self.preset(2))
+        preset_3 = tk.Button(self, text=self.preset_label(3),
+            command=lambda : self.preset(3))
+        preset_4 = tk.Button(self, text=self.preset_label(4),
+            command=lambda : self.preset(4))
+        preset_5 = tk.Button(self, text=self.preset_label(5),
+            command=lambda : self.preset(5))
+        preset_6 = tk.Button(self, text=self.preset_label(6),
+            command=lambda : self.preset(6))
+        preset_7 = tk.Button(self, text=self.preset_label(7),
+            command=lambda : self.preset(7))
+        preset_8 = tk.Button(self, text=self.preset_label(8),
+            command=lambda : self.preset(8))
         self.presets = [preset_1, preset_2, preset_3, preset_4,
                         preset_5, preset_6, preset_7, preset_8]
 
+        # A place to enter the URL of an HTTP (Icecast) stream; hitting a
+        # preset that isn't set then assigns it the stream instead.
+        stream_url_label = tk.Label(self, text='Stream URL:')
+        self.stream_url = tk.Entry(self, width=30)
+
         # The controls to delete all presets
         delete_button = tk.Button(self, text='Delete all presets',
             command=lambda : self.confirm_delete())
@@ -524,33 +682,81 @@ class MpmeRadioPage(tk.Frame):
         preset_6.grid(row=6, column=2)
         preset_7.grid(row=6, column=3)
         preset_8.grid(row=6, column=4)
-        delete_button.grid(row=7, column=1, columnspan=4)
+        stream_url_label.grid(row=7, column=1)
+        self.stream_url.grid(row=7, column=2, columnspan=3)
+        delete_button.grid(row=8, column=1, columnspan=4)
 
         # Start the simulated radio reception.
         self.radio_receiver = RadioReceiver(
             self.radio_freq_value, self.radio_volume)
 
     def start_reception(self):
-        self.timer = RepeatedTimer(1, self.receive_signal)
+        """ Turn on the simulated "radio reception", sound and all. """
+        self.controller.sound_object.start_audio()
+        self.radio_receiver.switch_on()
+        self.timer = self.controller.scheduler.every(1, self.receive_signal)
 
     def receive_signal(self):
-        """ Receive the simulated "radio signal". """
-        # Do this by checking the file of stations that are "broadcasting".
-        if self.radio_receiver.receiving_signal(self.radio_freq_value):
+        """ Receive the simulated "radio signal". (This runs in the
+            scheduler's thread, so it leaves the label to the main loop.) """
+        stream = self.stream
+        if stream is not None:
+            # Show the stream's name, with an * once it's playing.
+            text = MpmeStreamClient.name(stream.url)
+            if stream.state == "playing":
+                text = text + '*'
+        # Otherwise check the file of stations that are "broadcasting".
+        elif self.radio_receiver.receiving_signal(self.radio_freq_value):
             # Indicate we're getting the signal with an * after the frequency.
-            self.frequency_display.config(text=self.radio_freq_value + '*')
+            text = self.radio_freq_value + '*'
         else:
-            self.frequency_display.config(text=self.radio_freq_value)
+            text = self.radio_freq_value
+        self.controller.ui_queue.post(self.frequency_display,
+                                      self.frequency_display.config, text=text)
 
     # I need to look into this! This method can't be right!
     def stop_reception(self):
         """ Turn off the simulated "radio reception". """
         if hasattr(self, 'timer'):
-            self.timer.stop()
+            self.timer.cancel()
+        self.stop_stream()
+        self.radio_receiver.switch_off()
+
+    def play_stream(self, url):
+        """ Play the stream at a URL instead of the radio. """
+        self.stop_stream()
+        self.radio_receiver.switch_off()
+        self.stream = MpmeStreamClient(url, self.radio_volume)
+        self.stream.start()
+        self.receive_signal()
+
+    def stop_stream(self):
+        """ Stop the stream playing from a preset, if there is one. """
+        if self.stream is not None:
+            self.stream.stop()
+            self.stream = None
+
+    def preset_label(self, index):
+        """ Return the text for a preset button: the station's frequency,
+            the stream's name or (if it's not set) "Pre" and its number. """
+        return self.preset_label_for(
+            self.controller.settings_object.get_preset(index))
+
+    @staticmethod
+    def preset_label_for(preset):
+        """ Return the text for a preset button set to the given preset. """
+        if MpmeStreamClient.is_stream(preset):
+            return MpmeStreamClient.name(preset)
+        return preset
 
     def change_radio_freq(self, freq):
         """ Change the radio frequency. """
+        # Tuning the radio takes it off the stream, if one's playing.
+        if self.stream is not None:
+            self.stop_stream()
+            self.radio_receiver.switch_on()
         self.radio_freq_value = str(freq)
+        self.radio_receiver.change_freq(self.radio_freq_value)
         self.frequency_display.config(text=self.radio_freq_value)
         self.receive_signal()
         self.controller.settings_object.save_radio_freq(self.radio_freq_value)
@@ -558,8 +764,12 @@ class MpmeRadioPage(tk.Frame):
     def preset(self, preset):
         """ When the user hits a preset button do one of two things. If
             the button has no station assigned to it then assign it the
-            current frequency. If it has one then change the station. """
+            stream URL that was entered (if any) or else the current
+            frequency. If it has one then change the station. """
         text = self.controller.settings_object.get_preset(preset)
+        if MpmeStreamClient.is_stream(text):
+            self.play_stream(text)
+            return
         try:
             text = round(float(text), 1)
             preset_is_set = True
@@ -571,23 +781,28 @@ class MpmeRadioPage(tk.Frame):
         else:
             # Extract the preset number (from 1 to 8) from the button text.
             preset_number = preset
-            # Write the frequency on the button.
-            self.presets[preset_number-1].config(text=self.radio_freq_value)
+            url = self.stream_url.get().strip()
+            if MpmeStreamClient.is_stream(url):
+                # Assign the stream, and clear the URL for the next one.
+                station = url
+                self.stream_url.delete(0, tk.END)
+            else:
+                station = self.radio_freq_value
+            # Write the frequency (or stream's name) on the button.
+            self.presets[preset_number-1].config(
+                text=self.preset_label_for(station))
             # Also, write that preset to the settings file.
             self.controller.settings_object.save_preset(
-                preset_number, self.radio_freq_value)
+                preset_number, station)
 
     def scan(self, increment):
-        """ Scan the radio (by -.1 or +.1) until it gets a signal. """
-        getting_signal = False
-        original_radio_freq_value = self.radio_freq_value
-        while True:
-            self.adjust_freq(increment)
-            getting_signal = self.radio_receiver.receiving_signal(
-                self.radio_freq_value)
-            if getting_signal or \
-               self.radio_freq_value == original_radio_freq_value:
-                return
+        """ Scan the radio (down for -.1 or up for +.1) to the
+            next station with a signal, if there is one. """
+        freq = self.radio_receiver.next_station(self.radio_freq_value,
+            increment, self.MINIMUM_FREQ, self.MAXIMUM_FREQ)
+        if freq is not None:
+            self.change_radio_freq(freq)
+            self.radio_freq_slider.set(freq)
 
     def adjust_freq(self, increment):
         """ Adjust the radio frequency by "increment" (-.1 or +.1). """
@@ -601,15 +816,18 @@ class MpmeRadioPage(tk.Frame):
 
     def change_volume(self, volume):
         """ Change the radio's audio volume. """
+        self.radio_volume = volume
         self.radio_receiver.change_volume(volume)
+        if self.stream is not None:
+            self.stream.set_volume(volume)
         self.controller.settings_object.save_radio_volume(volume)
 
     def confirm_delete(self):
         """ Ask the user to confirm that (s)he
             wants to delete all the presets. """
-        self.confirmation_label.grid(row=8, column=1, columnspan=2)
-        self.button_yes.grid(row=8, column=3)
-        self.button_no.grid(row=8, column=4)
+        self.confirmation_label.grid(row=9, column=1, columnspan=2)
+        self.button_yes.grid(row=9, column=3)
+        self.button_no.grid(row=9, column=4)
 
     def hide_confirmation(self):
         """ Hide the confirmation question and the answer buttons. """
@@ -620,10 +838,12 @@ class MpmeRadioPage(tk.Frame):
     def delete_all_presets(self):
         """ Wipe out all the radio station presets,
             leaving just Pre 1, Pre 2, etc """
-        for i in range(len(self.presets)):
-            self.presets[i].config(text='Pre ' + str(i+1))
-            self.controller.settings_object.save_preset(
-                i+1, 'Pre ' + str(i+1))
+        # (Save them all at once rather than one at a time.)
+        with self.controller.settings_object.batch():
+            for i in range(len(self.presets)):
+                self.presets[i].config(text='Pre ' + str(i+1))
+                self.controller.settings_object.save_preset(
+                    i+1, 'Pre ' + str(i+1))
         self.hide_confirmation()
         
         
@@ -10,3 +10,75 @@ class MpmeConstants:
 
     # The name of the Settings folder
     SETTINGS_FOLDER = "__Mpme_Settings__"
+
+
+    # How many folder listings to keep in memory at most...
+    LISTING_CACHE_ENTRIES = 64
+
+    # ...and roughly how many bytes they may take up altogether
+    LISTING_CACHE_BYTES = 16 * 1024 * 1024
+
+    # How often (in seconds) to look for changes in the folder view
+    # when the operating system can't tell us about them itself
+    WATCH_POLL_INTERVAL = 5
+
+    # How often (in milliseconds) to apply changes in the folder view
+    WATCH_CHECK_MS = 500
+
+    # How often (in milliseconds) to check if the mixer reported that
+    # a song ended (which costs next to nothing when it didn't)
+    END_EVENT_CHECK_MS = 20
+
+    # How many sound files to read at once when scanning the folder view
+    SCANNER_WORKERS = 4
+
+    # How long (in seconds) to wait for another connection to be done
+    # writing to the library index before giving up
+    DATABASE_TIMEOUT = 30
+
+    # How often (in seconds) to show the position in the song
+    POSITION_REFRESH_INTERVAL = 0.25
+
+    # How long (in seconds) to hold on to changed settings before
+    # writing them, so a burst of changes gets written just once
+    SETTINGS_FLUSH_DELAY = 1
+
+    # How much of the radio's sound (in milliseconds) to make at a time,
+    # and how many of those blocks to make ahead of time
+    RADIO_BLOCK_MS = 50
+    RADIO_RING_BLOCKS = 4
+
+    # Which of the mixer's channels the radio's sound goes to
+    RADIO_CHANNEL = 0
+
+    # Which of the mixer's channels a stream (from a radio preset) goes to
+    STREAM_CHANNEL = 1
+
+    # How long (in seconds) to wait before connecting to a stream again
+    # after losing it - at first, and at most after failing over and over
+    STREAM_RETRY_MIN = 0.5
+    STREAM_RETRY_MAX = 16
+
+    # How long (in seconds) to wait for a stream's server to answer
+    STREAM_TIMEOUT = 10
+
+    # How many bytes of a stream to read at a time, and how
+    # many to hold on to at most before playing them
+    STREAM_READ_SIZE = 16 * 1024
+    STREAM_BUFFER_MAX = 1024 * 1024
+
+    # How much of a stream (in seconds) to buffer before starting to play
+    # it, how much to decode at a time, and how many pieces that size to
+    # decode ahead of time
+    STREAM_PREBUFFER = 3
+    STREAM_SEGMENT = 1
+    STREAM_DECODE_AHEAD = 2
+
+    # Which of the mixer's channels WAV files go to, and how much of them
+    # (in milliseconds) to hand the mixer at a time
+    PCM_CHANNEL = 2
+    PCM_CHUNK_MS = 100
+
+    # How often (in milliseconds) to apply updates to the
+    # widgets that were sent from other threads
+    UI_QUEUE_MS = 30
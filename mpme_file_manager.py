@@ -14,33 +14,29 @@ class MpmeFileManager():
         """ Check if the folder view exists. If it doesn't,
             create it. Ditto for the settings folder. """
 
-        # First, take note of the current path.
-        current_path = os.getcwd()
-
-        # Then change to the root folder.
-        os.chdir(MpmeConstants.ROOT_FOLDER)
+        folder_view = os.path.join(MpmeConstants.ROOT_FOLDER,
+                                   MpmeConstants.FOLDER_VIEW)
+        settings_folder = os.path.join(MpmeConstants.ROOT_FOLDER,
+                                       MpmeConstants.SETTINGS_FOLDER)
 
         # If the folder view doesn't exist, create it.
-        if not os.path.isdir(MpmeConstants.FOLDER_VIEW):
+        if not os.path.isdir(folder_view):
             try:
-                os.mkdir(MpmeConstants.FOLDER_VIEW)
+                os.mkdir(folder_view)
             except OSError:
                 print("Creation of Folder View failed.")
             else:
                 print("Creation of Folder View succeeded.")
 
         # If the settings folder doesn't exist, create it.
-        if not os.path.isdir(MpmeConstants.SETTINGS_FOLDER):
+        if not os.path.isdir(settings_folder):
             try:
-                os.mkdir(MpmeConstants.SETTINGS_FOLDER)
+                os.mkdir(settings_folder)
             except OSError:
                 print("Creation of Settings folder failed.")
             else:
                 print("Creation of Settings folder succeeded.")
 
-        # Reset the path back to what it was.
-        os.chdir(current_path)
-
     @staticmethod
     def filename_portion(filename):
         """ Return the real file name - that is without
@@ -61,38 +57,56 @@ class MpmeFileManager():
         return -1
 
     @staticmethod
-    def write_order(folder_list):
+    def write_order(folder_list, folder):
         """ Write the order of the files and folders into a file. """
-        # Presumably, the file will be written to the current path.
-        file_object = open(MpmeFileManager.ORDER_FILE_NAME, 'w')
-        for item in folder_list:
-            if item != MpmeFileManager.FOLDER_ICON + "..":
-                formatted_item = MpmeFileManager.filename_portion(item)
-                file_object.write(formatted_item + '\n')
-        file_object.close()
+        # Write a temporary file first and then put it in place of the
+        # old one, so a crash in the middle can't leave half an order.
+        order_file_name = os.path.join(folder, MpmeFileManager.ORDER_FILE_NAME)
+        temporary_file_name = order_file_name + ".tmp"
+        try:
+            with open(temporary_file_name, 'w') as file_object:
+                for item in folder_list:
+                    if item != MpmeFileManager.FOLDER_ICON + "..":
+                        formatted_item = MpmeFileManager.filename_portion(item)
+                        file_object.write(formatted_item + '\n')
+                file_object.flush()
+                os.fsync(file_object.fileno())
+            os.replace(temporary_file_name, order_file_name)
+        except:
+            # Don't leave the temporary file lying around.
+            try:
+                os.remove(temporary_file_name)
+            except OSError:
+                pass
+            raise
 
     @staticmethod
-    def read_order(folder_list):
+    def read_order(folder_list, folder):
         """ Read the order of files and subfolders in a folder and
             sort the list of files and subfolders accordingly. """
-        # Presumably, the file was written in the current path.
         try:
-            file_object = open(MpmeFileManager.ORDER_FILE_NAME, 'r')
+            file_object = open(os.path.join(folder,
+                MpmeFileManager.ORDER_FILE_NAME), 'r')
         except IOError:
             return '' # Do nothing; just keep the order as is.
 
-        writing_index = 0
-        file_or_folder_name = file_object.readline().strip()
-        while file_or_folder_name != "":
-            index_of_fof = MpmeFileManager.file_index(
-                folder_list, file_or_folder_name, writing_index)
-            if index_of_fof != -1:
-                element_we_want = folder_list.pop(index_of_fof)
-                folder_list.insert(writing_index, element_we_want)
-                writing_index = writing_index + 1
-            file_or_folder_name = file_object.readline().strip()         
+        # Rank each name by where it first appears in the file.
+        # (A blank line marks the end of the order.)
+        rank = {}
+        for line in file_object:
+            file_or_folder_name = line.strip()
+            if file_or_folder_name == "":
+                break
+            if file_or_folder_name not in rank:
+                rank[file_or_folder_name] = len(rank)
         file_object.close()
 
+        # Sort the ranked files and folders to the top. The sort is stable,
+        # so the ones not in the file keep their order after the others.
+        unranked = len(rank)
+        folder_list.sort(key=lambda item: rank.get(
+            MpmeFileManager.filename_portion(item), unranked))
+
     @staticmethod
     def is_folder(file_or_folder_name):
         """ Determine whether an item in the listing is a folder. """
@@ -103,9 +117,4 @@ class MpmeFileManager():
     def folder_name(path):
         """ Given a path, return the folder name at the end of it. """
         # Assume that there IS a valid path in the argument.
-        all_folders = path.split('\\')
-        i = len(all_folders) - 1
-        if all_folders[i] == '':
-            return all_folders[i-1]
-        else:
-            return all_folders[i]
+        return os.path.basename(os.path.normpath(path))
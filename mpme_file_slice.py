@@ -0,0 +1,38 @@
+import io
+
+class MpmeFileSlice(io.RawIOBase):
+    """ A read-only file object for the part of a file from a given
+        offset on, which looks to whoever reads it like a whole file """
+
+    def __init__(self, file_name, offset):
+        """ Open the file and start at the offset. """
+        io.RawIOBase.__init__(self)
+        self.file_object = open(file_name, 'rb')
+        self.offset = offset
+        self.file_object.seek(offset)
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, buffer):
+        """ Read as much as fits in the buffer. """
+        return self.file_object.readinto(buffer)
+
+    def seek(self, position, whence=io.SEEK_SET):
+        """ Go to a position counted from the offset (rather than from the
+            start of the file) and return the new position. """
+        if whence == io.SEEK_SET:
+            position = position + self.offset
+        return self.file_object.seek(position, whence) - self.offset
+
+    def tell(self):
+        """ Return the position, counted from the offset. """
+        return self.file_object.tell() - self.offset
+
+    def close(self):
+        """ Close the file. """
+        self.file_object.close()
+        io.RawIOBase.close(self)
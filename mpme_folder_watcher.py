@@ -0,0 +1,230 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+from mpme_file_manager import MpmeFileManager
+
+class MpmeFolderWatcher():
+    """ Class to watch the folder view for files and folders being added,
+        deleted or renamed, and to report which folders changed """
+    # The inotify event flags we care about (see <sys/inotify.h>)
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_DELETE_SELF = 0x00000400
+    IN_MOVE_SELF = 0x00000800
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ISDIR = 0x40000000
+    WATCH_MASK = IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | \
+        IN_DELETE_SELF | IN_MOVE_SELF
+    EVENT_HEADER = struct.Struct('iIII')
+
+    def __init__(self, root, on_change, poll_interval):
+        """ Start watching the folders under root. Whenever the contents of
+            a folder change, on_change gets called (from the watcher's own
+            thread) with the folder's path. If inotify isn't available, the
+            folders get checked every poll_interval seconds instead. (Finding
+            the folders means walking the whole folder view, so that's
+            done in the watcher's thread too, not the caller's.) """
+        self.root = os.path.abspath(root)
+        self.on_change = on_change
+        self.poll_interval = poll_interval
+        self.stop_event = threading.Event()
+        self.inotify_fd = None
+        # The modification times our own writes of order files gave
+        # folders, keyed by path, so polling can leave those out (see
+        # ignore_own_change). The lock is there since they're noted
+        # from the main thread.
+        self.own_changes = {}
+        self.own_changes_lock = threading.Lock()
+        self.thread = threading.Thread(target=self.watch, daemon=True)
+        self.thread.start()
+
+    def watch(self):
+        """ Watch the folders with inotify if we can, or else by polling.
+            (This runs in the watcher's thread.) """
+        self.inotify_fd = self.start_inotify()
+        if self.inotify_fd is None:
+            self.poll()
+        else:
+            self.read_inotify_events()
+
+    def stop(self):
+        """ Stop watching. """
+        self.stop_event.set()
+        self.thread.join()
+        if self.inotify_fd is not None:
+            os.close(self.inotify_fd)
+            self.inotify_fd = None
+
+    @staticmethod
+    def ignored(name):
+        """ Determine if a change to a file doesn't count - which is the
+            case for our own order file (and its temporary copy). """
+        return name.startswith(MpmeFileManager.ORDER_FILE_NAME)
+
+    @staticmethod
+    def subfolders(folder):
+        """ Return a list of the folders right inside a folder. """
+        try:
+            with os.scandir(folder) as scan:
+                return [entry.path for entry in scan
+                        if entry.is_dir(follow_symlinks=False)]
+        except OSError:
+            return [] # It vanished while we were looking; never mind.
+
+    def ignore_own_change(self, folder):
+        """ Note that we just wrote a folder's order file ourselves, so
+            polling doesn't report the folder as changed for it. (Inotify
+            leaves the order file out anyway; see ignored.) """
+        try:
+            mtime = os.stat(folder).st_mtime_ns
+        except OSError:
+            return
+        with self.own_changes_lock:
+            self.own_changes[os.path.abspath(folder)] = mtime
+
+    def folders_under(self, folder):
+        """ Return a list of the folder and all the folders within it. """
+        folders = [folder]
+        i = 0
+        while i < len(folders) and not self.stop_event.is_set():
+            folders.extend(self.subfolders(folders[i]))
+            i = i + 1
+        return folders
+
+    def start_inotify(self):
+        """ Set up inotify watches on every folder, if we're on Linux
+            and can. Return the inotify file descriptor, or None. """
+        if not sys.platform.startswith('linux'):
+            return None
+        try:
+            self.libc = ctypes.CDLL(ctypes.util.find_library('c'),
+                                    use_errno=True)
+            inotify_fd = self.libc.inotify_init()
+        except (OSError, AttributeError):
+            return None
+        if inotify_fd < 0:
+            return None
+        self.watched = {} # folder paths keyed by watch descriptor
+        for folder in self.folders_under(self.root):
+            if not self.add_watch(inotify_fd, folder):
+                # Probably too many folders for the system's
+                # limit on watches, so fall back on polling.
+                os.close(inotify_fd)
+                return None
+        return inotify_fd
+
+    def add_watch(self, inotify_fd, folder):
+        """ Watch a folder. Return False if the system won't let us. """
+        watch = self.libc.inotify_add_watch(inotify_fd,
+            os.fsencode(folder), self.WATCH_MASK)
+        if watch < 0:
+            # A folder that vanished in the meantime is no problem.
+            return ctypes.get_errno() == 2 # ENOENT
+        self.watched[watch] = folder
+        return True
+
+    def read_inotify_events(self):
+        """ Wait for inotify events and report the folders they're about. """
+        while not self.stop_event.is_set():
+            ready, _, _ = select.select([self.inotify_fd], [], [], 0.5)
+            if not ready:
+                continue
+            try:
+                data = os.read(self.inotify_fd, 64 * 1024)
+            except OSError:
+                return
+            changed = []
+            offset = 0
+            while offset < len(data):
+                watch, mask, cookie, length = \
+                    self.EVENT_HEADER.unpack_from(data, offset)
+                offset = offset + self.EVENT_HEADER.size
+                name = os.fsdecode(
+                    data[offset:offset + length].rstrip(b'\0'))
+                offset = offset + length
+                if mask & self.IN_Q_OVERFLOW:
+                    # We missed events, so assume everything changed.
+                    changed.extend(self.watched.values())
+                    continue
+                folder = self.watched.get(watch)
+                if folder is None:
+                    continue
+                if mask & self.IN_IGNORED:
+                    # The folder is gone, so it isn't watched any more.
+                    del self.watched[watch]
+                elif mask & (self.IN_DELETE_SELF | self.IN_MOVE_SELF):
+                    changed.append(os.path.dirname(folder))
+                elif not self.ignored(name):
+                    changed.append(folder)
+                    if mask & self.IN_ISDIR and \
+                       mask & (self.IN_CREATE | self.IN_MOVED_TO):
+                        # Watch the new folder (and any folders inside it).
+                        for new_folder in self.folders_under(
+                                os.path.join(folder, name)):
+                            self.add_watch(self.inotify_fd, new_folder)
+                            changed.append(new_folder)
+            # Report each folder once, in the order they came in.
+            for folder in dict.fromkeys(changed):
+                self.on_change(folder)
+
+    def poll(self):
+        """ Every so often, look at the modification time of every folder
+            we know of (but of no files) and report the folders that
+            changed. Only those get listed again, to pick up the folders
+            that were added to them or deleted from them. """
+        mtimes = self.folder_mtimes(self.root)
+        while not self.stop_event.wait(self.poll_interval):
+            for folder in list(mtimes):
+                if folder not in mtimes:
+                    continue # It went along with a folder it was in.
+                try:
+                    mtime = os.stat(folder).st_mtime_ns
+                except OSError:
+                    self.forget(mtimes, folder)
+                    self.on_change(os.path.dirname(folder))
+                    continue
+                if mtime == mtimes[folder]:
+                    continue
+                mtimes[folder] = mtime
+                with self.own_changes_lock:
+                    own_mtime = self.own_changes.pop(folder, None)
+                if mtime == own_mtime:
+                    continue # Only our own order file changed.
+                self.on_change(folder)
+                # See which folders inside it came and went.
+                current = set(self.subfolders(folder))
+                previous = set(known for known in mtimes
+                               if os.path.dirname(known) == folder)
+                for old_folder in previous - current:
+                    self.forget(mtimes, old_folder)
+                for new_folder in current - previous:
+                    new_mtimes = self.folder_mtimes(new_folder)
+                    mtimes.update(new_mtimes)
+                    for added_folder in new_mtimes:
+                        self.on_change(added_folder)
+
+    def folder_mtimes(self, folder):
+        """ Return the modification time of a folder and of each folder
+            within it, keyed by path. """
+        mtimes = {}
+        for folder in self.folders_under(folder):
+            try:
+                mtimes[folder] = os.stat(folder).st_mtime_ns
+            except OSError:
+                pass
+        return mtimes
+
+    @staticmethod
+    def forget(mtimes, folder):
+        """ Stop polling a folder that's gone, and the folders within it. """
+        inside = os.path.join(folder, '')
+        for known in list(mtimes):
+            if known == folder or known.startswith(inside):
+                del mtimes[known]
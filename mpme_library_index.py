@@ -0,0 +1,88 @@
+import os
+import sqlite3
+import threading
+from mpme_constants import MpmeConstants
+
+class MpmeLibraryIndex():
+    """ Class to keep an on-disk index of the folders and files
+        in the folder view so we don't have to ask the file
+        system about every single entry every time we need it """
+    INDEX_FILE_NAME = "mpme_library.db"
+
+    def __init__(self):
+        """ Open (or create) the index in the Settings folder. """
+        index_file = os.path.join(MpmeConstants.ROOT_FOLDER +
+            MpmeConstants.SETTINGS_FOLDER, self.INDEX_FILE_NAME)
+        # The index may be consulted from more than one thread,
+        # so share one connection and take turns using it.
+        self.lock = threading.Lock()
+        # The library scanner opens an index of its own, so if the other
+        # one is being written to, wait a while rather than giving up
+        # with "database is locked" - and let reading go on meanwhile.
+        self.connection = sqlite3.connect(index_file,
+            timeout=MpmeConstants.DATABASE_TIMEOUT, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        with self.lock, self.connection:
+            self.connection.execute("CREATE TABLE IF NOT EXISTS folders "
+                "(path TEXT PRIMARY KEY, mtime INTEGER)")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS entries "
+                "(folder TEXT, name TEXT, is_file INTEGER)")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS "
+                "entries_by_folder ON entries (folder)")
+
+    @staticmethod
+    def key(path):
+        """ Return the form of a path under which it's stored in the index. """
+        return os.path.normcase(os.path.normpath(path))
+
+    def listing(self, path):
+        """ Return a list of (name, is_file) pairs for everything in the
+            given folder. The folder is only rescanned if its modification
+            time changed since we last looked, which costs one stat
+            call instead of one for every entry in it. """
+        key = self.key(path)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            # The folder is gone, so forget about it.
+            self.forget(key)
+            return []
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT mtime FROM folders WHERE path = ?", (key,)).fetchone()
+            if row is not None and row[0] == mtime:
+                return [(name, bool(is_file)) for name, is_file in
+                        self.connection.execute("SELECT name, is_file FROM "
+                            "entries WHERE folder = ? ORDER BY rowid", (key,))]
+        return self.rescan(path, mtime)
+
+    def rescan(self, path, mtime):
+        """ Scan a folder on disk and store what we found in the index. """
+        key = self.key(path)
+        folder_listing = []
+        with os.scandir(path) as scan:
+            for entry in scan:
+                # Anything that isn't a file is treated as a folder.
+                folder_listing.append((entry.name, entry.is_file()))
+        with self.lock, self.connection:
+            self.connection.execute(
+                "DELETE FROM entries WHERE folder = ?", (key,))
+            self.connection.executemany("INSERT INTO entries "
+                "(folder, name, is_file) VALUES (?, ?, ?)",
+                [(key, name, is_file) for name, is_file in folder_listing])
+            self.connection.execute("INSERT OR REPLACE INTO folders "
+                "(path, mtime) VALUES (?, ?)", (key, mtime))
+        return folder_listing
+
+    def forget(self, key):
+        """ Remove a folder from the index. """
+        with self.lock, self.connection:
+            self.connection.execute(
+                "DELETE FROM entries WHERE folder = ?", (key,))
+            self.connection.execute(
+                "DELETE FROM folders WHERE path = ?", (key,))
+
+    def close(self):
+        """ Close the index. """
+        with self.lock:
+            self.connection.close()
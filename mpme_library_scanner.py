@@ -0,0 +1,63 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from file_lister import FileLister
+from mpme_library_index import MpmeLibraryIndex
+
+class MpmeLibraryScanner():
+    """ Class to read the details of every sound file in the folder view
+        in the background, a few files at a time, so they're already in
+        the metadata cache by the time anything needs them """
+
+    def __init__(self, root, metadata_cache, workers):
+        """ Start scanning the folders under root with
+            the given number of worker threads. """
+        self.root = os.path.abspath(root)
+        self.metadata_cache = metadata_cache
+        self.workers = workers
+        self.cancel_event = threading.Event()
+        self.thread = threading.Thread(target=self.scan, daemon=True)
+        self.thread.start()
+
+    def cancel(self):
+        """ Stop scanning. (Whatever was already read stays in the cache,
+            so the next scan will pick up where this one left off.) """
+        self.cancel_event.set()
+        self.thread.join()
+
+    def sound_files(self):
+        """ Generate the path of every acceptable sound
+            file under the root, a folder at a time. """
+        library = MpmeLibraryIndex()
+        folders = [self.root]
+        while folders and not self.cancel_event.is_set():
+            folder = folders.pop()
+            for name, is_file in library.listing(folder):
+                path = os.path.join(folder, name)
+                if not is_file:
+                    folders.append(path)
+                elif FileLister.acceptable_file(name):
+                    yield path
+        library.close()
+
+    def scan(self):
+        """ Read every sound file that isn't in the cache yet. """
+        # Files already in the cache were done by an earlier scan.
+        to_do = [path for path in self.sound_files()
+                 if self.metadata_cache.lookup(path) is None]
+        # Don't hand the workers more than a couple of files
+        # each at a time, so cancelling doesn't have to wait long.
+        slots = threading.Semaphore(self.workers * 2)
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for path in to_do:
+                slots.acquire()
+                if self.cancel_event.is_set():
+                    break
+                executor.submit(self.read, path).add_done_callback(
+                    lambda future: slots.release())
+
+    def read(self, path):
+        """ Read one sound file into the cache. """
+        if self.cancel_event.is_set():
+            return
+        self.metadata_cache.read(path)
@@ -0,0 +1,74 @@
+import os
+import sys
+from collections import OrderedDict
+from mpme_file_manager import MpmeFileManager
+from mpme_library_index import MpmeLibraryIndex
+
+class MpmeListingCache():
+    """ Class to remember the most recently used folder listings (already
+        sorted into the user's order) so going back into a folder
+        doesn't mean listing and sorting it all over again """
+
+    def __init__(self, max_entries, max_bytes):
+        """ Start with an empty cache that holds at most max_entries
+            listings taking up roughly max_bytes altogether. """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        # Keyed by folder, oldest first; each value is a
+        # (stamp, listing, size in bytes) triple.
+        self.listings = OrderedDict()
+        self.total_bytes = 0
+
+    @staticmethod
+    def stamp(folder):
+        """ Return the modification times of a folder and of its order file,
+            which change whenever the folder's listing would change,
+            or None if the folder can't be read. """
+        try:
+            folder_mtime = os.stat(folder).st_mtime_ns
+        except OSError:
+            return None
+        try:
+            order_mtime = os.stat(os.path.join(
+                folder, MpmeFileManager.ORDER_FILE_NAME)).st_mtime_ns
+        except OSError:
+            order_mtime = None
+        return (folder_mtime, order_mtime)
+
+    def get(self, folder, stamp):
+        """ Return the cached listing of a folder, or None if we don't have
+            it or the folder (or its order) changed since it was cached. """
+        key = MpmeLibraryIndex.key(folder)
+        cached = self.listings.get(key)
+        if cached is None:
+            return None
+        if stamp is None or cached[0] != stamp:
+            self.invalidate(folder)
+            return None
+        # It's now the most recently used listing.
+        self.listings.move_to_end(key)
+        return cached[1]
+
+    def put(self, folder, stamp, folder_listing):
+        """ Cache the listing of a folder, making room for it if need be. """
+        if stamp is None:
+            return
+        self.invalidate(folder)
+        size = sys.getsizeof(folder_listing) + \
+            sum(sys.getsizeof(item) for item in folder_listing)
+        if size > self.max_bytes:
+            return # It would never fit.
+        self.listings[MpmeLibraryIndex.key(folder)] = \
+            (stamp, folder_listing, size)
+        self.total_bytes = self.total_bytes + size
+        # Evict the least recently used listings until we're within limits.
+        while len(self.listings) > self.max_entries or \
+              self.total_bytes > self.max_bytes:
+            evicted = self.listings.popitem(last=False)[1]
+            self.total_bytes = self.total_bytes - evicted[2]
+
+    def invalidate(self, folder):
+        """ Forget the cached listing of a folder. """
+        cached = self.listings.pop(MpmeLibraryIndex.key(folder), None)
+        if cached is not None:
+            self.total_bytes = self.total_bytes - cached[2]
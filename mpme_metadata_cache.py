@@ -0,0 +1,179 @@
+import mmap
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from mpme_constants import MpmeConstants
+from mpme_mp3_frames import MpmeMp3Frames
+
+class MpmeMetadataCache():
+    """ Class to remember the length, tags, seek index (for MP3s) and a
+        few other details of every sound file we've looked at, so we don't
+        have to parse the file again every time it's played """
+    CACHE_FILE_NAME = "mpme_metadata.db"
+    # The details we keep for each file, in the order they're stored
+    FIELDS = ('duration', 'sample_rate', 'channels', 'bitrate',
+              'title', 'artist', 'album')
+
+    def __init__(self):
+        """ Open (or create) the cache in the Settings folder. """
+        cache_file = os.path.join(MpmeConstants.ROOT_FOLDER +
+            MpmeConstants.SETTINGS_FOLDER, self.CACHE_FILE_NAME)
+        # The cache gets filled in from other threads,
+        # so share one connection and take turns using it.
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(cache_file,
+                                          check_same_thread=False)
+        with self.lock, self.connection:
+            self.connection.execute("CREATE TABLE IF NOT EXISTS tracks "
+                "(path TEXT PRIMARY KEY, size INTEGER, mtime INTEGER, "
+                "duration REAL, sample_rate INTEGER, channels INTEGER, "
+                "bitrate INTEGER)")
+            # Caches made before we kept the tags and the
+            # seek indexes need columns for them.
+            columns = [row[1] for row in
+                       self.connection.execute("PRAGMA table_info(tracks)")]
+            for column, column_type in (('title', 'TEXT'), ('artist', 'TEXT'),
+                                        ('album', 'TEXT'),
+                                        ('seek_index', 'BLOB')):
+                if column not in columns:
+                    self.connection.execute("ALTER TABLE tracks ADD COLUMN "
+                                            + column + " " + column_type)
+        # Files we don't have the details of get read in the background,
+        # one at a time, by a thread of their own. The ones waiting to be
+        # read (or being read) are kept, keyed by path, with whatever is
+        # to be called once they're done, so a file that's asked for again
+        # in the meantime isn't read twice.
+        self.reader = ThreadPoolExecutor(max_workers=1)
+        self.pending = {}
+        self.pending_lock = threading.Lock()
+
+    @staticmethod
+    def key(path):
+        """ Return the form of a path under which it's stored in the cache. """
+        return os.path.normcase(os.path.abspath(path))
+
+    def lookup(self, path):
+        """ Return the details of a sound file as a dictionary,
+            or None if we don't have them (or the file changed). """
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        with self.lock:
+            row = self.connection.execute("SELECT " + ", ".join(self.FIELDS)
+                + ", seek_index IS NULL FROM tracks "
+                "WHERE path = ? AND size = ? AND mtime = ?",
+                (self.key(path), stat.st_size, stat.st_mtime_ns)).fetchone()
+        if row is None or row[self.FIELDS.index('title')] is None or \
+           (row[-1] and self.is_mp3(path)):
+            # (Without tags or, for an MP3, a seek index, it was
+            # cached before we kept them.)
+            return None
+        return dict(zip(self.FIELDS, row))
+
+    def seek_index(self, path):
+        """ Return the offset of the frame playing at each second of an MP3
+            file, or None if we don't have them (or the file changed). """
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        with self.lock:
+            row = self.connection.execute("SELECT seek_index FROM tracks "
+                "WHERE path = ? AND size = ? AND mtime = ?",
+                (self.key(path), stat.st_size, stat.st_mtime_ns)).fetchone()
+        if row is None or row[0] is None:
+            return None
+        return MpmeMp3Frames.unpack_index(row[0])
+
+    def get(self, path, on_ready):
+        """ Return the details of a sound file if we have them. If we don't,
+            return None, find them out in the background, and then call
+            on_ready (from the background thread) with the path and them. """
+        track_info = self.lookup(path)
+        if track_info is None:
+            key = self.key(path)
+            with self.pending_lock:
+                already_pending = key in self.pending
+                self.pending.setdefault(key, []).append(on_ready)
+            if not already_pending:
+                self.reader.submit(self.fill_in, path)
+        return track_info
+
+    def fill_in(self, path):
+        """ Read the details of a sound file, store them and report
+            them to everything that asked for them. """
+        track_info = self.read(path)
+        with self.pending_lock:
+            waiting = self.pending.pop(self.key(path), [])
+        if track_info is not None:
+            for on_ready in waiting:
+                on_ready(path, track_info)
+
+    def read(self, path):
+        """ Parse a sound file and store its details. Return
+            them, or None if the file couldn't be read. """
+        try:
+            stat = os.stat(path)
+            track_info = self.extract(path)
+        except Exception:
+            # A missing or corrupted file has no details to give.
+            return None
+        with self.lock, self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO tracks "
+                "(path, size, mtime, seek_index, " + ", ".join(self.FIELDS) +
+                ") VALUES (?, ?, ?, ?" + ", ?" * len(self.FIELDS) + ")",
+                (self.key(path), stat.st_size, stat.st_mtime_ns,
+                 track_info.pop('seek_index')) +
+                tuple(track_info[field] for field in self.FIELDS))
+        return track_info
+
+    @staticmethod
+    def is_mp3(path):
+        """ Determine if a sound file is an MP3 (as opposed to a WAV). """
+        return path[-3:].lower() == "mp3"
+
+    @staticmethod
+    def extract(path):
+        """ Parse a sound file and return its details (with the seek
+            index, for an MP3, packed into bytes). """
+        # (The parsers take a while to import, so don't
+        # import them until there's a file to parse.)
+        if path[-3:].lower() == "wav":
+            import soundfile as sf
+            with sf.SoundFile(path) as sf_object:
+                return {'duration': sf_object.frames / sf_object.samplerate,
+                        'sample_rate': sf_object.samplerate,
+                        'channels': sf_object.channels,
+                        'bitrate': 0,
+                        'title': sf_object.title,
+                        'artist': sf_object.artist,
+                        'album': sf_object.album,
+                        'seek_index': None}
+        else: # presumably it must be "MP3"
+            from mutagen.easyid3 import EasyID3
+            from mutagen.mp3 import MP3
+            mp3_object = MP3(path, ID3=EasyID3)
+            tags = mp3_object.tags or {}
+            # Go through the frames once, which gives the exact
+            # length as well as where to find each second.
+            with open(path, 'rb') as file_object, \
+                 mmap.mmap(file_object.fileno(), 0,
+                           access=mmap.ACCESS_READ) as data:
+                offsets, duration = MpmeMp3Frames.seek_index(data)
+            return {'duration': duration or mp3_object.info.length,
+                    'sample_rate': mp3_object.info.sample_rate,
+                    'channels': mp3_object.info.channels,
+                    'bitrate': mp3_object.info.bitrate,
+                    'title': ' / '.join(tags.get('title', [])),
+                    'artist': ' / '.join(tags.get('artist', [])),
+                    'album': ' / '.join(tags.get('album', [])),
+                    'seek_index': MpmeMp3Frames.pack_index(offsets)}
+
+    def close(self):
+        """ Close the cache. """
+        # (Let the file being read, if any, finish, but no others.)
+        self.reader.shutdown(cancel_futures=True)
+        with self.lock:
+            self.connection.close()
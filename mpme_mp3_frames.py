@@ -0,0 +1,140 @@
+import struct
+
+class MpmeMp3Frames():
+    """ Class for finding the frames in MP3 data and how long each one
+        plays, from the frames' headers alone (without decoding them) """
+
+    # Bitrates (in kbps) by MPEG version, layer and the header's bitrate
+    # index. Index 0 ("free format") and 15 (not allowed) aren't listed.
+    BITRATES = {
+        (1, 1): (None, 32, 64, 96, 128, 160, 192, 224,
+                 256, 288, 320, 352, 384, 416, 448),
+        (1, 2): (None, 32, 48, 56, 64, 80, 96, 112,
+                 128, 160, 192, 224, 256, 320, 384),
+        (1, 3): (None, 32, 40, 48, 56, 64, 80, 96,
+                 112, 128, 160, 192, 224, 256, 320),
+        (2, 1): (None, 32, 48, 56, 64, 80, 96, 112,
+                 128, 144, 160, 176, 192, 224, 256),
+        (2, 2): (None, 8, 16, 24, 32, 40, 48, 56,
+                 64, 80, 96, 112, 128, 144, 160),
+    }
+    BITRATES[(2, 3)] = BITRATES[(2, 2)]
+    # Sample rates by MPEG version (2.5 counting as 2 here) and
+    # the header's sample rate index
+    SAMPLE_RATES = {1: (44100, 48000, 32000),
+                    2: (22050, 24000, 16000),
+                    2.5: (11025, 12000, 8000)}
+    HEADER_SIZE = 4
+
+    @staticmethod
+    def parse_header(data, offset):
+        """ Read the frame header at the given offset and return the frame's
+            length in bytes, how many samples it holds and its sample rate;
+            or None if there's no (complete, valid) header there. """
+        header = data[offset:offset + MpmeMp3Frames.HEADER_SIZE]
+        if len(header) < MpmeMp3Frames.HEADER_SIZE or header[0] != 0xFF or \
+           header[1] & 0xE0 != 0xE0:
+            return None # no frame sync
+        version = {0: 2.5, 2: 2, 3: 1}.get((header[1] >> 3) & 3)
+        layer = {1: 3, 2: 2, 3: 1}.get((header[1] >> 1) & 3)
+        bitrate_index = header[2] >> 4
+        sample_rate_index = (header[2] >> 2) & 3
+        if version is None or layer is None or \
+           bitrate_index in (0, 15) or sample_rate_index == 3:
+            return None
+        bitrate = MpmeMp3Frames.BITRATES[(min(version, 2), layer)] \
+            [bitrate_index] * 1000
+        sample_rate = MpmeMp3Frames.SAMPLE_RATES[version][sample_rate_index]
+        padding = (header[2] >> 1) & 1
+        if layer == 1:
+            samples = 384
+            length = (12 * bitrate // sample_rate + padding) * 4
+        else:
+            samples = 576 if layer == 3 and version != 1 else 1152
+            length = samples // 8 * bitrate // sample_rate + padding
+        return length, samples, sample_rate
+
+    @staticmethod
+    def frames(data, offset=0):
+        """ Generate the offset, length, number of samples and sample rate
+            of each complete frame in the data from the offset on, skipping
+            anything between frames that isn't one (like a tag or junk). """
+        while True:
+            offset = data.find(b'\xff', offset)
+            if offset < 0:
+                return
+            frame = MpmeMp3Frames.parse_header(data, offset)
+            if frame is None or offset + frame[0] > len(data):
+                if frame is not None:
+                    return # The rest of the frame hasn't come in yet.
+                offset = offset + 1
+                continue
+            # Four bytes can look like a header by chance, so unless this
+            # is the last frame, make sure another frame follows it.
+            following = offset + frame[0]
+            if following + MpmeMp3Frames.HEADER_SIZE <= len(data) and \
+               MpmeMp3Frames.parse_header(data, following) is None:
+                offset = offset + 1
+                continue
+            yield (offset,) + frame
+            offset = following
+
+    @staticmethod
+    def tag_size(data):
+        """ Return the size of the ID3 tag at the start
+            of an MP3 file (or 0 if it doesn't have one). """
+        if len(data) < 10 or data[:3] != b'ID3':
+            return 0
+        # The size is in four bytes of seven bits each...
+        size = 0
+        for byte in data[6:10]:
+            size = (size << 7) | (byte & 0x7F)
+        # ...and leaves out the header and the footer, if there is one.
+        return size + (20 if data[5] & 0x10 else 10)
+
+    @staticmethod
+    def is_info_frame(data, offset):
+        """ Determine if the frame at the offset is a Xing, Info or VBRI
+            frame, which holds details about the file rather than sound. """
+        header = data[offset:offset + MpmeMp3Frames.HEADER_SIZE]
+        mono = header[3] >> 6 == 3
+        # The Xing/Info tag comes after the "side information",
+        # whose size depends on the MPEG version and channels.
+        if (header[1] >> 3) & 3 == 3: # MPEG 1
+            side_info = 17 if mono else 32
+        else:
+            side_info = 9 if mono else 17
+        xing = offset + MpmeMp3Frames.HEADER_SIZE + side_info
+        return data[xing:xing + 4] in (b'Xing', b'Info') or \
+            data[offset + 36:offset + 40] == b'VBRI'
+
+    @staticmethod
+    def seek_index(data):
+        """ Scan the frames of an MP3 file and return, for each second, the
+            offset of the frame playing at that time, along with the exact
+            length of the file (in seconds). """
+        offsets = []
+        seconds = 0
+        first = True
+        for offset, length, samples, sample_rate in \
+                MpmeMp3Frames.frames(data, MpmeMp3Frames.tag_size(data)):
+            if first and MpmeMp3Frames.is_info_frame(data, offset):
+                first = False
+                continue # It doesn't play.
+            first = False
+            end = seconds + samples / sample_rate
+            # This frame plays the seconds that start while it's playing.
+            while len(offsets) < end:
+                offsets.append(offset)
+            seconds = end
+        return offsets, seconds
+
+    @staticmethod
+    def pack_index(offsets):
+        """ Pack a seek index into bytes, for storing. """
+        return struct.pack('<%dQ' % len(offsets), *offsets)
+
+    @staticmethod
+    def unpack_index(packed):
+        """ Unpack a seek index that was packed into bytes. """
+        return struct.unpack('<%dQ' % (len(packed) // 8), packed)
@@ -0,0 +1,111 @@
+import os
+import threading
+from collections import OrderedDict
+
+class MpmePcmCache():
+    """ Class to keep the decoded samples of the most recently played songs
+        in memory (up to a set number of bytes), so playing one again or
+        jumping back in one starts right away instead of decoding the
+        file all over again """
+
+    def __init__(self, max_bytes):
+        """ Start with an empty cache that holds
+            at most max_bytes of samples. """
+        self.max_bytes = max_bytes
+        # Keyed by path, least recently used first; each value
+        # is a (stamp, samples) pair, the samples being bytes.
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        # The songs not to evict (the ones now playing, just played and
+        # lined up next) as long as there's any other song to evict
+        self.kept = set()
+        # Songs get decoded into the cache in the background.
+        self.lock = threading.Lock()
+        # How often the cache had a song it was asked for, didn't have
+        # one, and had to evict one to make room (for tuning its size)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(path):
+        """ Return the form of a path under which it's stored in the cache. """
+        return os.path.normcase(os.path.abspath(path))
+
+    @staticmethod
+    def stamp(path):
+        """ Return the size and modification time of a file, which change
+            whenever its samples would, or None if it can't be read. """
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return (stat.st_size, stat.st_mtime_ns)
+
+    def has(self, path):
+        """ Determine if a song's samples are in the cache
+            (without it counting as asking for them). """
+        with self.lock:
+            cached = self.entries.get(self.key(path))
+        return cached is not None and cached[0] == self.stamp(path)
+
+    def fits(self, size):
+        """ Determine if samples of the given size (in bytes) could
+            be cached at all. """
+        return size <= self.max_bytes
+
+    def get(self, path):
+        """ Return a song's samples, or None if we don't have
+            them or the file changed since they were cached. """
+        key = self.key(path)
+        stamp = self.stamp(path)
+        with self.lock:
+            cached = self.entries.get(key)
+            if cached is None or cached[0] != stamp:
+                self.misses = self.misses + 1
+                return None
+            self.hits = self.hits + 1
+            # It's now the most recently used song.
+            self.entries.move_to_end(key)
+            return cached[1]
+
+    def put(self, path, samples):
+        """ Cache a song's samples, making room for them if need be. """
+        stamp = self.stamp(path)
+        if stamp is None or not self.fits(len(samples)):
+            return # It would never fit.
+        key = self.key(path)
+        with self.lock:
+            cached = self.entries.pop(key, None)
+            if cached is not None:
+                self.total_bytes = self.total_bytes - len(cached[1])
+            self.entries[key] = (stamp, samples)
+            self.total_bytes = self.total_bytes + len(samples)
+            # Evict the least recently used songs until we're within the
+            # limit - the ones we're keeping only if there's nothing else.
+            while self.total_bytes > self.max_bytes:
+                evicted = next((cached_key for cached_key in self.entries
+                                if cached_key not in self.kept),
+                               next(iter(self.entries)))
+                self.total_bytes = self.total_bytes - \
+                    len(self.entries.pop(evicted)[1])
+                self.evictions = self.evictions + 1
+
+    def keep(self, paths):
+        """ Hold on to the given songs' samples rather than others'. """
+        with self.lock:
+            self.kept = {self.key(path) for path in paths if path is not None}
+
+    def clear(self):
+        """ Forget all the samples (when the mixer's format changes). """
+        with self.lock:
+            self.entries.clear()
+            self.total_bytes = 0
+
+    def stats(self):
+        """ Return the hits, misses and evictions so far, and how many
+            songs and bytes are in the cache now, as a dictionary. """
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses,
+                    'evictions': self.evictions,
+                    'songs': len(self.entries), 'bytes': self.total_bytes}
@@ -0,0 +1,253 @@
+import mmap
+import struct
+import threading
+from mpme_constants import MpmeConstants
+from mpme_samples import MpmeSamples, np, pg
+
+class MpmePcmPlayer():
+    """ Class to play a WAV file straight from its samples: the file is
+        memory-mapped, and a chunk at a time gets converted to the mixer's
+        format and handed to a mixer channel. Nothing is decoded and the
+        file is never read into memory as a whole, so even hours-long
+        recordings start right away and can jump to any sample. (It can
+        play samples that are already in memory the same way; see
+        from_samples.) """
+
+    # The WAV format codes we can play: plain PCM, floating point, and
+    # "extensible" (which says which of the two it is further on).
+    PCM = 1
+    FLOAT = 3
+    EXTENSIBLE = 0xFFFE
+
+    def __init__(self, file_name, volume):
+        """ Open a WAV file to play at the given volume (from 0.0 to 1.0).
+            Raise ValueError if it isn't a WAV file we can play. """
+        self.volume = volume
+        self.file_object = open(file_name, 'rb')
+        self.data = None
+        try:
+            self.data = mmap.mmap(self.file_object.fileno(), 0,
+                                  access=mmap.ACCESS_READ)
+            self.read_header()
+        except (ValueError, OSError, struct.error):
+            if self.data is not None:
+                self.data.close()
+            self.file_object.close()
+            raise ValueError(file_name + " isn't a WAV file we can play.")
+        self.get_ready()
+
+    @classmethod
+    def from_samples(cls, samples, rate, size, channels, volume):
+        """ Make a player for samples that were already decoded (as bytes,
+            in the mixer's format given by its rate, size and channels)
+            rather than for a WAV file. Raise ValueError if the size is
+            one we can't play (signed 8-bit or unsigned 16-bit). """
+        if size not in (8, -16, 32):
+            raise ValueError("an unplayable sample size")
+        player = cls.__new__(cls)
+        player.volume = volume
+        player.file_object = None
+        player.data = samples
+        player.channels = channels
+        player.sample_rate = rate
+        player.bits = abs(size)
+        player.is_float = size == 32
+        player.block_align = player.bits // 8 * channels
+        player.samples_start = 0
+        player.sample_count = len(samples) // player.block_align
+        player.get_ready()
+        return player
+
+    def get_ready(self):
+        """ Get ready to start playing from the beginning. """
+        self.position = 0 # in the file's samples (per channel)
+        self.position_lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.channel = None
+        self.paused = False
+
+    @staticmethod
+    def handles(file_name):
+        """ Determine if a file gets played this way. """
+        return file_name[-4:].lower() == ".wav"
+
+    def read_header(self):
+        """ Find the format of the samples and where they are in the file. """
+        if self.data[:4] != b'RIFF' or self.data[8:12] != b'WAVE':
+            raise ValueError("not a WAV file")
+        fmt = None
+        offset = 12
+        # Go through the chunks ("fmt ", "data", and whatever
+        # else there is) until we've found the samples.
+        while offset + 8 <= len(self.data):
+            chunk_id = self.data[offset:offset + 4]
+            size = struct.unpack('<I', self.data[offset + 4:offset + 8])[0]
+            start = offset + 8
+            if chunk_id == b'fmt ':
+                fmt = struct.unpack('<HHIIHH', self.data[start:start + 16])
+                if fmt[0] == self.EXTENSIBLE:
+                    # The real format code starts the "sub-format".
+                    fmt = (struct.unpack('<H', self.data[start + 24:
+                                                        start + 26])[0],) \
+                        + fmt[1:]
+            elif chunk_id == b'data':
+                if fmt is None:
+                    raise ValueError("no format chunk before the samples")
+                # (A recording that got cut off may claim more
+                # samples than it has.)
+                size = min(size, len(self.data) - start)
+                break
+            offset = start + size + (size & 1) # Chunks are word-aligned.
+        else:
+            raise ValueError("no samples")
+        format_code, self.channels, self.sample_rate, _, block_align, \
+            self.bits = fmt
+        if format_code == self.PCM and self.bits in (8, 16, 24, 32):
+            self.is_float = False
+        elif format_code == self.FLOAT and self.bits in (32, 64):
+            self.is_float = True
+        else:
+            raise ValueError("an unplayable format")
+        self.block_align = block_align
+        self.samples_start = start
+        self.sample_count = size // block_align
+
+    def start(self, seconds=0, paused=False):
+        """ Start playing from the given number of seconds into the file
+            (or leave it paused there). (The mixer must be started.) """
+        self.position = min(seconds * self.sample_rate, self.sample_count)
+        self.paused = paused
+        self.channel = pg.mixer.Channel(MpmeConstants.PCM_CHANNEL)
+        self.channel.set_volume(self.volume)
+        self.thread = threading.Thread(target=self.play, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """ Stop playing and close the file. """
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        if self.channel is not None:
+            self.channel.stop()
+            self.channel = None
+        # (Samples that were handed to us aren't ours to close.)
+        if self.file_object is not None:
+            self.data.close()
+            self.file_object.close()
+
+    def pause(self):
+        """ Pause playing. """
+        self.paused = True
+        self.channel.pause()
+
+    def unpause(self):
+        """ Go on playing. """
+        self.paused = False
+        self.channel.unpause()
+
+    def set_volume(self, volume):
+        """ Set the volume to a value from 0.0 to 1.0. """
+        self.volume = volume
+        if self.channel is not None:
+            self.channel.set_volume(volume)
+
+    def seek(self, seconds):
+        """ Jump to the given number of seconds into the file. """
+        with self.position_lock:
+            self.position = min(max(0, seconds * self.sample_rate),
+                                self.sample_count)
+            # Drop what was handed to the mixer from the old position.
+            self.channel.stop()
+            if self.paused:
+                # (A stopped channel can't be paused, so the next
+                # chunk waits until we go on playing.)
+                self.channel.pause()
+
+    def finished(self):
+        """ Determine if the whole file has been played. (This may be
+            asked from another thread, even as the player is stopped.) """
+        channel = self.channel
+        return self.position >= self.sample_count and \
+            (channel is None or not channel.get_busy())
+
+    def samples(self, first, count):
+        """ Return a view (not a copy) of the file's samples, from the given
+            one on, as numbers in an array with a column per channel. """
+        count = max(0, min(count, self.sample_count - first))
+        offset = self.samples_start + first * self.block_align
+        if self.bits == 24:
+            # NumPy has no 3-byte numbers, so just get the bytes for now.
+            return np.frombuffer(self.data, np.uint8,
+                                 count * self.block_align,
+                                 offset).reshape(count, self.channels, 3)
+        if self.is_float:
+            dtype = '<f' + str(self.bits // 8)
+        elif self.bits == 8:
+            dtype = np.uint8 # (8-bit WAVs are unsigned.)
+        else:
+            dtype = '<i' + str(self.bits // 8)
+        return np.frombuffer(self.data, dtype, count * self.channels,
+                             offset).reshape(count, self.channels)
+
+    def to_float(self, samples):
+        """ Convert samples to floating point numbers from -1 to 1. """
+        if self.bits == 24:
+            # Put the three bytes together (as the top of a 32-bit number,
+            # so the sign comes out right).
+            samples = (samples[..., 0].astype(np.int32) << 8 |
+                       samples[..., 1].astype(np.int32) << 16 |
+                       samples[..., 2].astype(np.int32) << 24)
+            return samples / 2 ** 31
+        if self.is_float:
+            return samples.astype(np.float64)
+        if self.bits == 8:
+            return (samples.astype(np.float64) - 128) / 128
+        return samples / 2 ** (self.bits - 1)
+
+    def next_chunk(self, rate, length):
+        """ Return the next "length" samples at the mixer's rate (as numbers
+            from -1 to 1 with a column per channel) and move on past them;
+            or None if the file's all played. """
+        if self.position >= self.sample_count:
+            return None
+        step = self.sample_rate / rate
+        first = int(self.position)
+        # The file's samples that the chunk falls between...
+        needed = int(self.position - first + length * step) + 2
+        samples = self.to_float(self.samples(first, needed))
+        if step == 1 and self.position == first:
+            chunk = samples[:length]
+        else:
+            # ...and the chunk's samples, drawn as straight lines
+            # between them (to change the rate).
+            times = self.position - first + np.arange(length) * step
+            times = times[times <= len(samples) - 1]
+            chunk = np.column_stack([
+                np.interp(times, np.arange(len(samples)), samples[:, i])
+                for i in range(self.channels)])
+        if len(chunk) == 0:
+            # We're within a sample of the end.
+            self.position = self.sample_count
+            return None
+        self.position = self.position + len(chunk) * step
+        return chunk
+
+    def play(self):
+        """ Hand the mixer the file a chunk at a time, whenever it's running
+            out, until we're stopped. (After the end of the file, there
+            may still be a jump back into it.) """
+        rate, size, channels = pg.mixer.get_init()
+        length = rate * MpmeConstants.PCM_CHUNK_MS // 1000
+        while not self.stop_event.is_set():
+            # (Hold the position still, so a jump can't
+            # come between taking a chunk and queueing it.)
+            with self.position_lock:
+                if not self.paused and self.channel.get_queue() is None:
+                    chunk = self.next_chunk(rate, length)
+                    if chunk is not None:
+                        chunk = MpmeSamples.to_mixer_format(chunk, size,
+                                                            channels)
+                        self.channel.queue(pg.sndarray.make_sound(chunk))
+            self.stop_event.wait(MpmeConstants.PCM_CHUNK_MS / 4000)
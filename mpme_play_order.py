@@ -0,0 +1,195 @@
+import os
+from mpme_file_manager import MpmeFileManager
+from mpme_library_index import MpmeLibraryIndex
+
+class MpmePlayOrder():
+    """ Class to hold every song in the folder view in the order in which
+        they'll be played, that is, depth first, with each folder sorted
+        the way the user arranged it. Then finding the next (or previous)
+        song is just a matter of stepping through a list. """
+
+    def __init__(self, file_lister):
+        """ Start with an empty order; it's built
+            the first time it's needed. """
+        self.file_lister = file_lister
+        self.tracks = None
+        # The folders whose contents or order changed since we listed them
+        self.stale = set()
+
+    def invalidate(self, folder=None):
+        """ Note that a folder's order or contents changed, so its part of
+            the play order has to be listed again (or, if no folder is
+            given, that the whole play order has to be built again). """
+        if folder is None:
+            self.tracks = None
+        elif self.tracks is not None:
+            self.stale.add(MpmeLibraryIndex.key(os.path.abspath(folder)))
+
+    def build(self):
+        """ Walk the whole folder view and list every song in play order.
+            Each song is a (folder path, file name, row) triple, where the
+            row is where the song appears in its folder's listing. """
+        # Besides the songs in one long list, we keep each folder's own
+        # listing: its songs, and the keys of the folders in it, in the
+        # order they're played. That way, when a folder changes, only
+        # its listing needs to be read again, and the long list only
+        # changes in the stretch that holds that folder's songs. Where
+        # each song is in the long list is kept in a dictionary, keyed
+        # by its folder's key and its name, so it can be found at once.
+        self.positions = {}
+        self.folders = {}
+        self.items = {}
+        self.counts = {}
+        self.stale = set()
+        root = os.path.abspath(self.file_lister.ROOT_FOLDER)
+        self.root_key = MpmeLibraryIndex.key(root)
+        tracks = []
+        self.add_folder(root, tracks, False)
+        self.tracks = tracks
+        self.note_positions(0)
+
+    def note_positions(self, start):
+        """ Note where each song is in the play order, from the given
+            place on (since the songs before it haven't moved). """
+        for index in range(start, len(self.tracks)):
+            folder, name, row = self.tracks[index]
+            self.positions[(MpmeLibraryIndex.key(folder), name)] = index
+
+    def add_folder(self, folder, tracks, reuse):
+        """ Add the songs in a folder, and in the folders within it, to
+            "tracks" in the order they're played, and note the folder's
+            listing. If "reuse" is True, the folders within it that we
+            already know are copied from the play order rather than
+            being listed again. """
+        key = MpmeLibraryIndex.key(folder)
+        old_items = set(item for item in self.items.get(key, [])
+                        if isinstance(item, str))
+        items = []
+        count = len(tracks)
+        folder_list = self.file_lister.get_nonvisual_list(folder)
+        for row in range(len(folder_list)):
+            name = MpmeFileManager.filename_portion(folder_list[row])
+            if MpmeFileManager.is_folder(folder_list[row]):
+                if name != "..":
+                    subfolder = os.path.join(folder, name)
+                    subfolder_key = MpmeLibraryIndex.key(subfolder)
+                    if reuse and subfolder_key in old_items:
+                        start = self.start_of(subfolder_key)
+                        tracks.extend(self.tracks[start:start +
+                            self.counts[subfolder_key]])
+                    else:
+                        self.add_folder(subfolder, tracks, False)
+                    items.append(subfolder_key)
+            else:
+                tracks.append((folder, name, row))
+                items.append(tracks[-1])
+        # The folders that are gone from this one are gone from the order.
+        for subfolder_key in old_items.difference(items):
+            self.forget(subfolder_key)
+        self.folders[key] = folder
+        self.items[key] = items
+        self.counts[key] = len(tracks) - count
+
+    def forget(self, key):
+        """ Drop a folder, and the folders within it, from the order. """
+        for item in self.items.pop(key, []):
+            if isinstance(item, str):
+                self.forget(item)
+        self.folders.pop(key, None)
+        self.counts.pop(key, None)
+
+    def start_of(self, key):
+        """ Return where a folder's songs start in the play order. """
+        if key == self.root_key:
+            return 0
+        parent_key = MpmeLibraryIndex.key(
+            os.path.dirname(self.folders[key]))
+        start = self.start_of(parent_key)
+        for item in self.items[parent_key]:
+            if item == key:
+                break
+            start = start + (self.counts[item] if isinstance(item, str)
+                             else 1)
+        return start
+
+    def relist(self, key):
+        """ List a folder that changed again and put its songs in place
+            of its old ones, leaving the rest of the order as it was. """
+        start = self.start_of(key)
+        old_count = self.counts[key]
+        tracks = []
+        # (The folders we reuse are copied before anything is replaced.)
+        self.add_folder(self.folders[key], tracks, True)
+        for folder, name, row in self.tracks[start:start + old_count]:
+            del self.positions[(MpmeLibraryIndex.key(folder), name)]
+        self.tracks[start:start + old_count] = tracks
+        # The songs from here on may have moved.
+        self.note_positions(start)
+        # The folders it's in now hold that many more (or fewer) songs.
+        change = len(tracks) - old_count
+        while key != self.root_key:
+            key = MpmeLibraryIndex.key(os.path.dirname(self.folders[key]))
+            self.counts[key] = self.counts[key] + change
+
+    def bring_up_to_date(self):
+        """ Build the order if it hasn't been built, or else list the
+            folders that changed again (but only those). """
+        if self.tracks is None:
+            self.build()
+            return
+        folders_to_relist = set()
+        for key in self.stale:
+            # A new folder is picked up by listing the one it's in.
+            while key not in self.folders and key != self.root_key and \
+                  os.path.dirname(key) != key:
+                key = os.path.dirname(key)
+            if key in self.folders:
+                folders_to_relist.add(key)
+        self.stale = set()
+        # Deepest first, so listing a folder can reuse the (already
+        # brought up to date) folders within it.
+        for key in sorted(folders_to_relist, key=len, reverse=True):
+            if key in self.folders: # (unless it was dropped meanwhile)
+                self.relist(key)
+
+    def position_of(self, folder, name):
+        """ Return where a song is in the play order, or None if it isn't. """
+        return self.positions.get((MpmeLibraryIndex.key(folder), name))
+
+    def track_of(self, folder, name):
+        """ Return a song as it is in the play order now (that is, with
+            the row it's in now), or None if it isn't in it. """
+        self.bring_up_to_date()
+        index = self.position_of(folder, name)
+        if index is None:
+            return None
+        return self.tracks[index]
+
+    def step(self, folder, name, increment):
+        """ Return the song that's "increment" songs away from the given one
+            (wrapping around at either end), or None if there are no songs. """
+        self.bring_up_to_date()
+        if not self.tracks:
+            return None
+        index = self.position_of(folder, name)
+        if index is None:
+            # The song might have been deleted while it was playing, so
+            # go to the first song at or after the folder it was in.
+            return self.first_track_from(folder)
+        return self.tracks[(index + increment) % len(self.tracks)]
+
+    def next_track(self, folder, name):
+        """ Return the song after the given one. """
+        return self.step(folder, name, 1)
+
+    def previous_track(self, folder, name):
+        """ Return the song before the given one. """
+        return self.step(folder, name, -1)
+
+    def first_track_from(self, folder):
+        """ Return the first song in the given folder or any folder in it,
+            or the very first song if there isn't any there. """
+        folder_key = MpmeLibraryIndex.key(folder)
+        if self.counts.get(folder_key):
+            return self.tracks[self.start_of(folder_key)]
+        return self.tracks[0]
@@ -0,0 +1,60 @@
+import importlib
+
+class MpmeLazyModule():
+    """ A stand-in for a module that takes a while to import (like NumPy
+        or pygame), which imports it the first time anything in it is
+        used - so just importing the modules that need it is quick. """
+
+    def __init__(self, name):
+        """ Get ready to import the module with the given name. """
+        self.name = name
+        self.module = None
+
+    def __getattr__(self, attribute):
+        """ Import the module (unless that's been done) and
+            return the given attribute of it. """
+        if self.module is None:
+            self.module = importlib.import_module(self.name)
+        return getattr(self.module, attribute)
+
+# NumPy and pygame take a while to import, so they wait until the
+# audio is started, or something is about to be played this way.
+np = MpmeLazyModule("numpy")
+pg = MpmeLazyModule("pygame")
+
+class MpmeSamples():
+    """ Class for working with samples that we make or read ourselves
+        (like the radio's sound and WAV files) before handing them
+        to the mixer """
+
+    @staticmethod
+    def to_mixer_format(samples, size, channels):
+        """ Convert samples (as numbers from -1 to 1, in an array with
+            either one column per channel or just one dimension, for mono)
+            to the mixer's sample size and number of channels. """
+        if samples.ndim == 1:
+            samples = samples[:, np.newaxis]
+        if samples.shape[1] == 1 and channels > 1:
+            samples = np.repeat(samples, channels, axis=1)
+        elif samples.shape[1] > channels:
+            if channels == 1:
+                samples = samples.mean(axis=1, keepdims=True)
+            else:
+                samples = samples[:, :channels]
+        elif samples.shape[1] < channels:
+            samples = np.pad(samples,
+                             ((0, 0), (0, channels - samples.shape[1])))
+        if size == 32: # 32-bit floating point
+            samples = samples.astype(np.float32)
+        else:
+            bits = abs(size)
+            peak = 2 ** (bits - 1) - 1
+            samples = np.round(np.clip(samples, -1, 1) *
+                               peak).astype(np.int32)
+            if size > 0: # unsigned
+                samples = (samples + peak + 1).astype('uint' + str(bits))
+            else:
+                samples = samples.astype('int' + str(bits))
+        if channels == 1:
+            samples = samples[:, 0]
+        return np.ascontiguousarray(samples)
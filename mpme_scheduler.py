@@ -0,0 +1,91 @@
+import heapq
+import itertools
+import threading
+import time
+import traceback
+
+class MpmeScheduledJob():
+    """ A handle on a job given to the scheduler, for cancelling it """
+
+    def __init__(self, interval, function, args):
+        """ Take note of what to run and how often (None for just once). """
+        self.interval = interval
+        self.function = function
+        self.args = args
+        self.cancelled = False
+        self.start = time.monotonic()
+        self.runs = 0 # how many intervals have gone by
+
+    def cancel(self):
+        """ Cancel the job. This never waits; if the job is running
+            right now, it just won't run again. """
+        self.cancelled = True
+
+class MpmeScheduler():
+    """ Class to run jobs after a delay or every so often, all
+        from one thread, instead of a thread for every timer """
+
+    def __init__(self):
+        """ Start the scheduler's thread with nothing to do. """
+        self.jobs = [] # a heap of (when, sequence number, job)
+        self.sequence = itertools.count()
+        self.condition = threading.Condition()
+        self.stopped = False
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def every(self, interval, function, *args):
+        """ Run function every "interval" seconds from now on. The times
+            are measured from when the job was scheduled, so a late run
+            doesn't push the later ones back. Return the job's handle. """
+        job = MpmeScheduledJob(interval, function, args)
+        self.add(job, job.start + interval)
+        return job
+
+    def after(self, delay, function, *args):
+        """ Run function once, "delay" seconds from
+            now. Return the job's handle. """
+        job = MpmeScheduledJob(None, function, args)
+        self.add(job, job.start + delay)
+        return job
+
+    def add(self, job, when):
+        """ Put a job in line to run at the given (monotonic) time. """
+        with self.condition:
+            heapq.heappush(self.jobs, (when, next(self.sequence), job))
+            # Wake the thread up in case this job comes first.
+            self.condition.notify()
+
+    def stop(self):
+        """ Stop the scheduler; no more jobs will run. """
+        with self.condition:
+            self.stopped = True
+            self.condition.notify()
+        self.thread.join()
+
+    def run(self):
+        """ Wait for each job's time to come and run it. """
+        while True:
+            with self.condition:
+                while not self.stopped and \
+                      (not self.jobs or self.jobs[0][0] > time.monotonic()):
+                    if self.jobs:
+                        self.condition.wait(self.jobs[0][0] - time.monotonic())
+                    else:
+                        self.condition.wait()
+                if self.stopped:
+                    return
+                when, sequence, job = heapq.heappop(self.jobs)
+            if job.cancelled:
+                continue
+            try:
+                job.function(*job.args)
+            except Exception:
+                # One job going wrong shouldn't stop all the others.
+                traceback.print_exc()
+            if job.interval is not None and not job.cancelled:
+                # Schedule the next run on the job's original beat,
+                # skipping any runs we were too late for.
+                job.runs = max(job.runs + 1, int(
+                    (time.monotonic() - job.start) / job.interval))
+                self.add(job, job.start + (job.runs + 1) * job.interval)
@@ -1,43 +1,78 @@
+import contextlib
 import json
 import os
+import threading
 from mpme_constants import MpmeConstants
 
 class MpmeSettings:
     """ A class to retrieve, store, and write settings """
 
-    def __init__(self):
-        """ Establish the constants and initialize the object. """
-        self.SETTINGS_FOLDER = MpmeConstants.ROOT_FOLDER + \
-            MpmeConstants.SETTINGS_FOLDER
-        self.SETTINGS_FILE = "mpme_settings.json"
-        self.FREQ_DEFAULT = "44100"
+    # The version of the settings file's layout. Add one whenever a setting
+    # is added to DEFAULTS (or an old one changes its meaning).
+    SCHEMA_VERSION = 4
+
+    # Every setting, with the value it gets if it's missing from the file
+    DEFAULTS = {
+        "freq": "44100",
         # ^- The original setting, good for "real" MP3 files, was 44100.
         # Sometimes, it seems like the figure should be more like 48500.
-        self.BITSIZE_DEFAULT = -16 # unsigned 16 bit
-        self.CHANNELS_DEFAULT = 2  # 1 is mono, 2 is stereo
-        self.BUFFER_DEFAULT = "2048"
+        "bitsize": -16, # unsigned 16 bit
+        "channels": 2,  # 1 is mono, 2 is stereo
+        "buffer": "2048",
         # ^- number of samples (experiment to get best sound)
-        self.VOLUME_DEFAULT = 100 # Valid values are from 0 to 100.
-        self.RADIO_FREQ_DEFAULT = "87.5" # Valid values are from 87.5 to 108.0.
-        self.PRESET_1_DEFAULT = "Pre 1"
-        self.PRESET_2_DEFAULT = "Pre 2"
-        self.PRESET_3_DEFAULT = "Pre 3"
-        self.PRESET_4_DEFAULT = "Pre 4"
-        self.PRESET_5_DEFAULT = "Pre 5"
-        self.PRESET_6_DEFAULT = "Pre 6"
-        self.PRESET_7_DEFAULT = "Pre 7"
-        self.PRESET_8_DEFAULT = "Pre 8"
+        "volume": 100, # Valid values are from 0 to 100.
+        "radio_freq": "87.5", # Valid values are from 87.5 to 108.0.
+        "radio_volume": 100,
+        "pre_1": "Pre 1",
+        "pre_2": "Pre 2",
+        "pre_3": "Pre 3",
+        "pre_4": "Pre 4",
+        "pre_5": "Pre 5",
+        "pre_6": "Pre 6",
+        "pre_7": "Pre 7",
+        "pre_8": "Pre 8",
+        # Version 2:
+        "gapless": True, # Line up the next song ahead of time.
+        # Version 3:
+        "fast_start": True,
+        # ^- Put off starting the audio and building the pages
+        # until they're needed, so the window comes up sooner.
+        # Version 4:
+        "pcm_cache": False,
+        # ^- Keep the decoded samples of the songs just played, now playing
+        # and coming up next in memory, so going back to one (or jumping
+        # around in one) is instant. It takes a lot of memory: about
+        # 10 MB per minute of song at CD quality.
+        "pcm_cache_mb": 256, # the most memory (in MB) the cache may take
+    }
+
+    def __init__(self, scheduler):
+        """ Establish the constants and initialize the object. Changes
+            get written to the file a little later, by the scheduler. """
+        self.SETTINGS_FOLDER = MpmeConstants.ROOT_FOLDER + \
+            MpmeConstants.SETTINGS_FOLDER
+        self.SETTINGS_FILE = os.path.join(self.SETTINGS_FOLDER,
+                                          "mpme_settings.json")
+        self.scheduler = scheduler
+        # Changes are kept in memory and only written to the file every so
+        # often, so dragging a slider doesn't mean hundreds of writes. The
+        # lock guards the settings and the "dirty" flag between the main
+        # thread and the scheduler's; the write lock keeps two writes of
+        # the file from overlapping.
+        self.lock = threading.Lock()
+        self.write_lock = threading.Lock()
+        self.dirty = False
+        self.flush_job = None
+        # While a batch is going on, this holds its changes (see batch).
+        self.pending = None
+        # Whether the file was written by a newer version of MPMe, in which
+        # case we leave it alone (see load).
+        self.newer_file = False
         self.load()
 
     def load(self):
         """ Read the settings and store them. """
 
-        # First, take note of the current path.
-        current_path = os.getcwd()
-
-        # Then change to the Settings folder.
-        os.chdir(self.SETTINGS_FOLDER)
-
         # If the file doesn't exist, create it.
         if not os.path.isfile(self.SETTINGS_FILE):
             with open(self.SETTINGS_FILE, "w") as settings_file:
@@ -47,33 +82,46 @@ class MpmeSettings:
         # Read the settings.
         with open(self.SETTINGS_FILE, "r") as settings_file:
             self.settings = json.load(settings_file)
-        # If some settings are missing (because the file got
-        # corrupted or something) get default values for them.
-        # Not only will they be needed during the run, but they
+        # Files from before we kept a version are version 1.
+        version = self.settings.get("version", 1)
+        # If some settings are missing (because the file is from an older
+        # version, or got corrupted or something) get default values for
+        # them. Not only will they be needed during the run, but they
         # should be written to the settings file for the future.
-        self.check_for_key("freq", self.FREQ_DEFAULT)
-        self.check_for_key("bitsize", self.BITSIZE_DEFAULT)
-        self.check_for_key("channels", self.CHANNELS_DEFAULT)
-        self.check_for_key("buffer", self.BUFFER_DEFAULT)
-        self.check_for_key("volume", self.VOLUME_DEFAULT)
-        self.check_for_key("radio_freq", self.RADIO_FREQ_DEFAULT)
-        self.check_for_key("radio_volume", self.VOLUME_DEFAULT)
-        self.check_for_key("pre_1", self.PRESET_1_DEFAULT)
-        self.check_for_key("pre_2", self.PRESET_2_DEFAULT)
-        self.check_for_key("pre_3", self.PRESET_3_DEFAULT)
-        self.check_for_key("pre_4", self.PRESET_4_DEFAULT)
-        self.check_for_key("pre_5", self.PRESET_5_DEFAULT)
-        self.check_for_key("pre_6", self.PRESET_6_DEFAULT)
-        self.check_for_key("pre_7", self.PRESET_7_DEFAULT)
-        self.check_for_key("pre_8", self.PRESET_8_DEFAULT)
-
-        # Reset the path back to what it was.
-        os.chdir(current_path)
-
-    def check_for_key(self, key, default):
-        """ Check for a settings in the settings. """
-        if not key in self.settings:
-            self.settings[key] = default
+        missing = [key for key in self.DEFAULTS if key not in self.settings]
+        if version > self.SCHEMA_VERSION:
+            # A newer version of MPMe wrote the file. Writing it with our
+            # older version number (and without the settings we don't
+            # know about) would downgrade it, so we don't write it at all;
+            # changes made during the run only last until it's over.
+            self.newer_file = True
+            for key in missing:
+                self.settings[key] = self.DEFAULTS[key]
+        elif missing or version < self.SCHEMA_VERSION:
+            with self.batch():
+                for key in missing:
+                    self.change(key, self.DEFAULTS[key])
+                self.change("version", self.SCHEMA_VERSION)
+
+    @contextlib.contextmanager
+    def batch(self):
+        """ Hold on to all the changes made in a "with" block and make them
+            all at once at the end of it, with a single write of the file -
+            or, if the block raises an exception, drop them all. Batches
+            are for the main thread; a batch within a batch is just part
+            of the outer one. """
+        if self.pending is not None:
+            yield
+            return
+        self.pending = {}
+        try:
+            yield
+            with self.lock:
+                self.settings.update(self.pending)
+            if self.pending:
+                self.schedule_flush()
+        finally:
+            self.pending = None
 
     def get_radio_freq(self):
         """ Get the radio frequency from the settings. """
@@ -91,65 +139,125 @@ class MpmeSettings:
         """ Get the folder view's volume from the settings. """
         return self.settings['volume']
 
+    def get_gapless(self):
+        """ Get whether songs should play one into the next without a gap. """
+        return self.settings['gapless']
+
+    def get_fast_start(self):
+        """ Get whether to put off whatever we can until after startup. """
+        return self.settings['fast_start']
+
     def get_preset(self, index):
         """ Get a radio station preset; for example, an index of 1
             would mean to get the station for preset number 1. """
         return self.settings['pre_' + str(index)]
 
-    def save_settings(self, new_settings):
-        """ Write the Settings file. """
-
-        # First, take note of the current path.
-        current_path = os.getcwd()
-
-        # Then change to the Settings folder.
-        os.chdir(self.SETTINGS_FOLDER)
-
-        # Now write the Settings file
+    def save_settings(self):
+        """ Write the Settings file right away (taking along any changes
+            that were waiting to be written) and return an error message,
+            or an empty string if it went fine. """
+        if self.newer_file:
+            return "Error:\nThe settings file is from a newer " + \
+                "version of MPMe,\nso the settings weren't saved."
+        with self.lock:
+            self.dirty = False
+            if self.flush_job is not None:
+                self.flush_job.cancel()
+                self.flush_job = None
+            contents = json.dumps(self.settings)
         try:
-            settings_file = open(self.SETTINGS_FILE, "w")
-            json.dump(new_settings, settings_file)
-            settings_file.close()
+            self.write_file(contents)
         except:
             message = "Error:\nThe settings failed to save."
         else:
             message = ""
-        finally:
-            # Reset the path back to what it was.
-            os.chdir(current_path)
-            return message
+        return message
+
+    def write_file(self, contents):
+        """ Replace the Settings file with the given contents. """
+        # Write a temporary file first and then put it in place of the old
+        # one, so a crash in the middle can't leave half the settings.
+        temporary_file_name = self.SETTINGS_FILE + ".tmp"
+        with self.write_lock:
+            with open(temporary_file_name, "w") as settings_file:
+                settings_file.write(contents)
+                settings_file.flush()
+                os.fsync(settings_file.fileno())
+            os.replace(temporary_file_name, self.SETTINGS_FILE)
+
+    def change(self, key, value):
+        """ Change a setting in memory and see that it gets written to the
+            file shortly (or, during a batch, when the batch is over). """
+        if self.pending is not None:
+            self.pending[key] = value
+            return
+        with self.lock:
+            self.settings[key] = value
+        self.schedule_flush()
+
+    def schedule_flush(self):
+        """ Note that the settings changed and have the scheduler write
+            them to the file shortly, unless it's going to already. """
+        if self.newer_file:
+            return # (See load.)
+        with self.lock:
+            self.dirty = True
+            # One write takes care of all the changes made until it happens.
+            if self.flush_job is None:
+                self.flush_job = self.scheduler.after(
+                    MpmeConstants.SETTINGS_FLUSH_DELAY, self.flush)
+
+    def flush(self):
+        """ Write the settings to the file if any changed since the last
+            write. (This runs in the scheduler's thread, or at closing.) """
+        with self.lock:
+            self.flush_job = None
+            if not self.dirty:
+                return
+            self.dirty = False
+            contents = json.dumps(self.settings)
+        try:
+            self.write_file(contents)
+        except OSError:
+            # Leave the changes marked so the next flush tries again.
+            with self.lock:
+                self.dirty = True
+
+    def close(self):
+        """ Write any changes that haven't been written yet. """
+        with self.lock:
+            if self.flush_job is not None:
+                self.flush_job.cancel()
+                self.flush_job = None
+        self.flush()
 
     def save_volume(self, new_volume):
         """ Save the Folder view's volume in the settings file. """
-        self.settings['volume'] = new_volume
-        self.save_settings(self.settings)
+        self.change('volume', new_volume)
 
     def default_freq(self):
         """ Get the default frequency for MP3 files. """
-        return self.FREQ_DEFAULT
+        return self.DEFAULTS["freq"]
 
     def default_channels(self):
         """ Get the default number of channels. """
-        return self.CHANNELS_DEFAULT
+        return self.DEFAULTS["channels"]
 
     def default_buffer(self):
         """ Get the default buffer size. """
-        return self.BUFFER_DEFAULT
+        return self.DEFAULTS["buffer"]
 
     def save_radio_volume(self, new_volume):
         """ Save the radio's volume in the settings file. """
-        self.settings['radio_volume'] = new_volume
-        self.save_settings(self.settings)
+        self.change('radio_volume', new_volume)
 
     def save_radio_freq(self, new_radio_freq):
         """ Save the radio frequency to the settings file. """
-        self.settings['radio_freq'] = new_radio_freq
-        self.save_settings(self.settings)
+        self.change('radio_freq', new_radio_freq)
 
     def save_preset(self, preset_number, freq):
         """ Save the frequency as the preset of a given number. """
-        self.settings['pre_' + str(preset_number)] = freq
-        self.save_settings(self.settings)
+        self.change('pre_' + str(preset_number), freq)
 
     def valid(self, requested_freq, requested_buffer):
         """ Validate the settings the user specified. """
@@ -1,11 +1,15 @@
-import pygame as pg
-import soundfile as sf
-from mutagen.mp3 import MP3
+import queue
+import threading
+import time
+from mpme_file_slice import MpmeFileSlice
+from mpme_pcm_cache import MpmePcmCache
+from mpme_pcm_player import MpmePcmPlayer
+from mpme_samples import pg
 
 class MpmeSound:
     """ The sound file class """
 
-    def __init__(self, settings):
+    def __init__(self, settings, metadata_cache):
         """ Initialize the sound object. """
         # set up the mixer
         # Here are the original settings:
@@ -17,24 +21,105 @@ class MpmeSound:
         #channels = 2     # 1 is mono, 2 is stereo
         #buffer = 2048    # number of samples (experiment to get best sound)
 
-        self.set_settings(settings)
+        # Where we look up the songs' lengths
+        self.metadata_cache = metadata_cache
+        self.music_file_name = None
+        # Whether a song is loaded (playing or paused) as opposed to stopped
+        self.song_loaded = False
+        # What plays a WAV file, or a song whose samples are in the
+        # cache (rather than the mixer's music module)
+        self.pcm_player = None
+        # The decoded samples of the songs just played, now playing and
+        # lined up next, if that's turned on
+        if settings['pcm_cache']:
+            self.pcm_cache = MpmePcmCache(settings['pcm_cache_mb'] * 1024 *
+                                          1024)
+        else:
+            self.pcm_cache = None
+        self.previous_file_name = None
+        # Songs get decoded into the cache one at a time, by a thread of
+        # their own. The songs waiting to be decoded (or being decoded)
+        # are handed over through a queue and noted in a set, which has
+        # a lock of its own since both threads change it. Every time the
+        # mixer is restarted, its generation goes up, so samples decoded
+        # for the old settings can be told apart and thrown away; the
+        # mixer lock keeps the two threads from both at it at once.
+        self.decode_queue = queue.Queue()
+        self.decoding = set()
+        self.decoding_lock = threading.Lock()
+        self.decoder = None
+        self.mixer_lock = threading.Lock()
+        self.mixer_generation = 0
+
+        # The song lined up to play after this one (if any), and
+        # how far into the song we were the last time we checked.
+        self.queued_file_name = None
+        self.last_position = 0
+
+        # The position in the song is kept by our own clock rather than
+        # by asking the mixer: it's the position we last started (or
+        # jumped) from plus the time since then, if the song is playing.
+        self.position_base = 0
+        self.playing_since = None
+
+        # The mixer settings we last asked for
+        self.mixer_settings = None
+        self.end_event = None
+        # The audio gets started when the first song plays (or when
+        # start_audio is called); until then we just keep the settings.
+        self.audio_started = False
+        self.settings = settings
+        self.volume = settings['volume']/100
+
+    def start_audio(self):
+        """ Import pygame and start the mixer, unless that's been done. """
+        if self.audio_started:
+            return
+        self.audio_started = True
+        self.set_settings(self.settings)
+
+        # Have the mixer post an event when a song ends. (Pygame's event
+        # queue needs the display module, though no window gets opened.)
+        try:
+            pg.display.init()
+            self.end_event = pg.USEREVENT + 1
+            pg.mixer.music.set_endevent(self.end_event)
+        except pg.error:
+            self.end_event = None
 
     def set_volume(self, volume):
         """ Set the volume to a value from 0.0 to 1.0. """
-        pg.mixer.music.set_volume(volume)
+        self.volume = volume
+        if self.audio_started:
+            pg.mixer.music.set_volume(volume)
+        if self.pcm_player is not None:
+            self.pcm_player.set_volume(volume)
 
     def play(self, music_file_name):
         """ Stream music with the mixer.music module in a blocking manner.
             This will stream the sound from the disk while playing. """
-        music_file_type = music_file_name[-3:].lower()
+        # Look up the song's length. If we don't know it yet it'll be
+        # found in the background, so don't hold up the song for it.
+        if music_file_name != self.music_file_name:
+            self.previous_file_name = self.music_file_name
+        self.music_file_name = music_file_name
+        self.look_up_length()
+        # (Loading a song drops whatever song was lined up.)
+        self.queued_file_name = None
+        self.last_position = 0
+        self.start_audio()
+        self.stop_pcm()
 
-        if music_file_type == "wav":
-            sf_object = sf.SoundFile(music_file_name)
-            self.music_file_length = int(len(sf_object) / sf_object.samplerate)
-        else: # presumably it must be "MP3"
-            self.music_file_length = int(MP3(music_file_name).info.length)
+        self.keep_in_cache()
 
-        clock = pg.time.Clock()
+        # Play a WAV file straight from its samples (or any song
+        # whose samples are in the cache), if we can.
+        if self.start_pcm(0, False):
+            pg.mixer.music.stop()
+            self.song_loaded = True
+            self.start_clock(0)
+            self.clear_end_events()
+            return
 
         try:
             # Load the song we want.
@@ -43,29 +128,309 @@ class MpmeSound:
             # If the music file wasn't found, do nothing.
             return
         pg.mixer.music.play()
-        
+        self.song_loaded = True
+        # Decode it for the cache, so going back to it will be instant.
+        self.cache_in_background(music_file_name)
+        self.start_clock(0)
+        # Stopping the old song to play this one
+        # doesn't count as a song ending.
+        self.clear_end_events()
+
+    def has_end_event(self):
+        """ Return True if the mixer tells us when a song ends (and
+            False if we have to keep checking if it's still playing). """
+        return self.end_event is not None
+
+    def end_of_song(self):
+        """ Return True if the mixer reported that the song ended
+            (or that the song lined up after it started) since the
+            last time we checked. This has to run in the main thread. """
+        pcm_player = self.pcm_player
+        if pcm_player is not None:
+            return pcm_player.finished()
+        if self.end_event is None:
+            return False
+        return len(pg.event.get(self.end_event)) > 0
+
+    def start_pcm(self, position, paused):
+        """ Play the song now playing (a WAV file, or a song whose samples
+            are in the cache) straight from its samples, from the given
+            position (or leave it paused there). Return False if it
+            can't be played that way. """
+        try:
+            if MpmePcmPlayer.handles(self.music_file_name):
+                self.pcm_player = MpmePcmPlayer(self.music_file_name,
+                                                self.volume)
+            else:
+                if self.pcm_cache is None:
+                    return False
+                samples = self.pcm_cache.get(self.music_file_name)
+                if samples is None:
+                    return False
+                self.pcm_player = MpmePcmPlayer.from_samples(
+                    samples, *pg.mixer.get_init(), self.volume)
+        except (ValueError, OSError):
+            return False
+        self.pcm_player.start(position, paused)
+        return True
+
+    def stop_pcm(self):
+        """ Stop playing a WAV file, if we are. """
+        if self.pcm_player is not None:
+            self.pcm_player.stop()
+            self.pcm_player = None
+
+    def keep_in_cache(self, next_file_name=None):
+        """ Have the cache hold on to the songs just played, now playing
+            and coming up next rather than any others. """
+        if self.pcm_cache is not None:
+            self.pcm_cache.keep([self.previous_file_name,
+                                 self.music_file_name, next_file_name])
+
+    def cache_in_background(self, music_file_name):
+        """ Have the decoder thread decode a song into the cache, unless
+            the cache is off, already has it (or will), or it wouldn't
+            fit in the cache anyway. """
+        if self.pcm_cache is None or \
+           MpmePcmPlayer.handles(music_file_name) or \
+           self.pcm_cache.has(music_file_name):
+            return
+        # Don't decode a song only to find it's too big. (If we don't know
+        # its length yet, as when it's played for the first time, decode
+        # it anyway; the cache won't take it if it turns out not to fit.)
+        size = self.decoded_size(music_file_name)
+        if size is not None and not self.pcm_cache.fits(size):
+            return
+        with self.decoding_lock:
+            if music_file_name in self.decoding:
+                return
+            self.decoding.add(music_file_name)
+        if self.decoder is None:
+            self.decoder = threading.Thread(target=self.keep_decoding,
+                                            daemon=True)
+            self.decoder.start()
+        self.decode_queue.put(music_file_name)
+
+    def decoded_size(self, music_file_name):
+        """ Return about how many bytes a song will take once it's decoded
+            for the mixer, or None if we don't know how long it is. """
+        track_info = self.metadata_cache.get(music_file_name,
+                                             lambda *args: None)
+        mixer_format = pg.mixer.get_init()
+        if track_info is None or mixer_format is None:
+            return None
+        rate, size, channels = mixer_format
+        return int(track_info['duration'] * rate) * abs(size) // 8 * channels
+
+    def keep_decoding(self):
+        """ Decode the songs handed over into the cache, one after another.
+            (This runs on the decoder thread.) """
+        while True:
+            music_file_name = self.decode_queue.get()
+            try:
+                # (The mixer lock is only held for a moment either side of
+                # the decode, so restarting the mixer never waits for it.)
+                with self.mixer_lock:
+                    generation = self.mixer_generation
+                    if pg.mixer.get_init() is None:
+                        continue
+                samples = pg.mixer.Sound(music_file_name).get_raw()
+                with self.mixer_lock:
+                    # If the mixer was restarted meanwhile,
+                    # the samples are for the old settings.
+                    if generation == self.mixer_generation:
+                        self.pcm_cache.put(music_file_name, samples)
+            except (pg.error, OSError):
+                pass # It'll just be played without the cache.
+            finally:
+                with self.decoding_lock:
+                    self.decoding.discard(music_file_name)
+
+    def cache_stats(self):
+        """ Return how well the cache is doing (see MpmePcmCache.stats),
+            or None if it's off. """
+        if self.pcm_cache is None:
+            return None
+        return self.pcm_cache.stats()
+
+    def clear_end_events(self):
+        """ Throw away any reports of songs ending. """
+        if self.end_event is not None:
+            pg.event.get(self.end_event)
+
+    def look_up_length(self):
+        """ Look up the length of the song now playing. If we don't know
+            it yet it'll be found in the background, so don't wait. """
+        track_info = self.metadata_cache.get(self.music_file_name,
+                                             self.metadata_ready)
+        if track_info is None:
+            self.music_file_length = 0
+        else:
+            self.music_file_length = track_info['duration']
+
+    def queue(self, music_file_name):
+        """ Line up a song to start playing as soon as this one ends,
+            without a gap. (It replaces any song already lined up.) """
+        # Get its samples ready in the cache for when it starts,
+        # whether or not the mixer can line it up.
+        self.keep_in_cache(music_file_name)
+        self.cache_in_background(music_file_name)
+        # The mixer can only go from song to song by itself with songs
+        # it plays (which isn't the case for WAV files).
+        if self.pcm_player is not None or \
+           MpmePcmPlayer.handles(music_file_name):
+            self.queued_file_name = None
+            return
+        try:
+            pg.mixer.music.queue(music_file_name)
+        except pg.error:
+            # If the music file wasn't found, don't line anything up.
+            self.queued_file_name = None
+            return
+        self.queued_file_name = music_file_name
+        # Get the song's length ready for when it starts.
+        self.metadata_cache.get(music_file_name, lambda *args: None)
+
+    def advanced_to_queued(self):
+        """ Return True (once) if the song that was lined up has started
+            playing, and from then on treat it as the song now playing. """
+        # The mixer starts counting from zero again when
+        # it goes on to the song that was lined up.
+        position = pg.mixer.music.get_pos()
+        advanced = self.queued_file_name is not None and \
+            0 <= position < self.last_position
+        self.last_position = position
+        if advanced:
+            self.advance_to_queued()
+        return advanced
+
+    def advance_to_queued(self):
+        """ Treat the song that was lined up as the song now playing. """
+        self.previous_file_name = self.music_file_name
+        self.music_file_name = self.queued_file_name
+        self.queued_file_name = None
+        self.last_position = 0
+        self.start_clock(0)
+        self.look_up_length()
+
     def pause(self):
         """ Pause the song. """
-        pg.mixer.music.pause()
+        if self.pcm_player is not None:
+            self.pcm_player.pause()
+        else:
+            pg.mixer.music.pause()
+        self.stop_clock(self.get_position())
 
     def unpause(self):
         """ Unpause the song. """
-        pg.mixer.music.unpause()
+        if self.pcm_player is not None:
+            self.pcm_player.unpause()
+        else:
+            pg.mixer.music.unpause()
+        self.start_clock(self.position_base)
 
     def stop(self):
         """ Stop the song """
+        if not self.audio_started:
+            return # No song could have been played yet.
+        self.stop_pcm()
         pg.mixer.music.stop()
+        self.song_loaded = False
+        self.queued_file_name = None
+        self.stop_clock(0)
+        self.clear_end_events()
+
+    def start_clock(self, position):
+        """ Start the position clock running from the given position. """
+        self.position_base = position
+        self.playing_since = time.monotonic()
+
+    def stop_clock(self, position):
+        """ Stop the position clock at the given position. """
+        self.position_base = position
+        self.playing_since = None
 
     def get_position(self):
-        """ Get the position - that is, how many
-            seconds into the song we currently are. """
-        return pg.mixer.music.get_pos()//1000
+        """ Get the position - that is, how many seconds (to the
+            millisecond) into the song we currently are. """
+        if self.playing_since is None:
+            return self.position_base
+        return round(self.position_base +
+                     time.monotonic() - self.playing_since, 3)
 
     def set_position(self, position):
         """ Set the position - that is, how many seconds
             into the song to which we should jump. """
-        pg.mixer.music.rewind() # ...or else the position will be relative.
-        pg.mixer.music.set_pos(position)
+        if not self.song_loaded:
+            return # There's no song to jump around in.
+        if self.pcm_player is not None:
+            # A WAV file can jump right to any sample.
+            self.pcm_player.seek(position)
+            if self.playing_since is None:
+                self.stop_clock(position)
+            else:
+                self.start_clock(position)
+            return
+        # If the song's samples have been cached since it started, play
+        # them from there instead; they can jump right to any sample.
+        paused = self.playing_since is None
+        if self.pcm_cache is not None and \
+           self.pcm_cache.has(self.music_file_name) and \
+           self.start_pcm(position, paused):
+            pg.mixer.music.stop()
+            # (The song lined up after it is dropped with the
+            # music, as it is whenever a song is played this way.)
+            self.queued_file_name = None
+            self.clear_end_events()
+            if paused:
+                self.stop_clock(position)
+            else:
+                self.start_clock(position)
+            return
+        # If we know where each second of the song starts in the file,
+        # start playing the file from there. (Otherwise the mixer would
+        # decode everything up to there, and for files with a variable
+        # bitrate it doesn't land in quite the right place anyway.)
+        seek_index = self.metadata_cache.seek_index(self.music_file_name)
+        if seek_index is not None and int(position) < len(seek_index):
+            self.load_from(seek_index[int(position)])
+        else:
+            pg.mixer.music.rewind() # ...or else the position is relative.
+            try:
+                pg.mixer.music.set_pos(position)
+            except pg.error:
+                # The mixer can't jump around in every kind of file (like
+                # a WAV file the PCM player couldn't open and left to the
+                # mixer), so then the song just starts over from the top.
+                position = 0
+        if self.playing_since is None:
+            self.stop_clock(position) # The song is paused.
+        else:
+            self.start_clock(position)
+        # Don't mistake the jump for going on to the next song.
+        self.last_position = pg.mixer.music.get_pos()
+
+    def load_from(self, offset):
+        """ Load the song now playing from the frame that starts at the
+            given offset in the file, and play it (or leave it paused). """
+        paused = self.playing_since is None
+        queued_file_name = self.queued_file_name
+        pg.mixer.music.load(MpmeFileSlice(self.music_file_name, offset),
+                            "mp3")
+        pg.mixer.music.play()
+        if paused:
+            pg.mixer.music.pause()
+        # Loading the song again doesn't count as it ending, and
+        # it drops the song that was lined up, so line it up again.
+        self.clear_end_events()
+        self.queued_file_name = None
+        if queued_file_name is not None:
+            self.queue(queued_file_name)
+
+    def metadata_ready(self, music_file_name, track_info):
+        """ Take note of the song's length once it's been found. """
+        if music_file_name == self.music_file_name:
+            self.music_file_length = track_info['duration']
 
     def get_length(self):
         """ Return the length of the music file. """
@@ -75,14 +440,94 @@ class MpmeSound:
             return 0
 
     def song_is_over(self):
-        """ Returns True if the song is over and False if a song is playing """
+        """ Returns True if the song is over and False if a song is playing.
+            (This may run in the scheduler's thread, so it only looks;
+            stopping the song is left to the main thread, which plays
+            the next song or stops.) """
+        # (Take the player once, in case the main
+        # thread stops it while we're looking.)
+        pcm_player = self.pcm_player
+        if pcm_player is not None:
+            return pcm_player.finished()
         return not pg.mixer.music.get_busy()
 
     def set_settings(self, settings):
-        """ Set the settings( the frequency, volume, etc)
-            and initialize the sound object. """
-        pg.mixer.quit() #...in case it was already initialized.
-        freq = int(settings['freq'])
-        buffer = int(settings['buffer'])
-        pg.mixer.init(freq, settings['bitsize'], settings['channels'], buffer)
+        """ Set the settings (the frequency, volume, etc) and initialize
+            the mixer - but only if it isn't set up that way already,
+            since starting the mixer over cuts off the song. """
+        self.settings = settings
+        if not self.audio_started:
+            # Hold on to them for when the audio starts.
+            self.volume = settings['volume']/100
+            return
+        mixer_settings = (int(settings['freq']), int(settings['bitsize']),
+                          int(settings['channels']), int(settings['buffer']))
+        # The mixer says what frequency, size and channels it has (though
+        # not its buffer), but it may have rounded the frequency we asked
+        # for; so if it has exactly those settings or we asked for these
+        # same ones last time, it's good as it is.
+        current = pg.mixer.get_init()
+        up_to_date = current is not None and \
+            self.mixer_settings is not None and \
+            mixer_settings in (current + self.mixer_settings[3:],
+                               self.mixer_settings)
+        if not up_to_date:
+            self.restart_mixer(mixer_settings)
         self.set_volume(settings['volume']/100)
+
+    def restart_mixer(self, mixer_settings):
+        """ Initialize the mixer with the given frequency, size, channels
+            and buffer, and pick up the song (if any) where it left off. """
+        resuming = self.song_loaded
+        position = self.get_position()
+        paused = self.playing_since is None
+        queued_file_name = self.queued_file_name
+        self.stop_pcm()
+        with self.mixer_lock:
+            self.mixer_generation = self.mixer_generation + 1
+            pg.mixer.quit() #...in case it was already initialized.
+            pg.mixer.init(*mixer_settings)
+            # Samples decoded for the old settings would play wrong now.
+            if self.pcm_cache is not None:
+                self.pcm_cache.clear()
+        self.mixer_settings = mixer_settings
+        if self.end_event is not None:
+            pg.mixer.music.set_endevent(self.end_event)
+        if resuming:
+            self.resume(position, paused, queued_file_name)
+
+    def resume(self, position, paused, queued_file_name):
+        """ Start the song now playing over from the given position (paused,
+            if it was) and line up the song that was lined up after it. """
+        if self.start_pcm(position, paused):
+            if paused:
+                self.stop_clock(position)
+            else:
+                self.start_clock(position)
+            return
+        try:
+            pg.mixer.music.load(self.music_file_name)
+        except pg.error:
+            # If the music file is gone, there's nothing to pick up.
+            self.song_loaded = False
+            self.queued_file_name = None
+            self.stop_clock(0)
+            return
+        try:
+            pg.mixer.music.play(start=position)
+        except pg.error:
+            # Not every kind of file can start partway through.
+            pg.mixer.music.play()
+            position = 0
+        if paused:
+            pg.mixer.music.pause()
+            self.stop_clock(position)
+        else:
+            self.start_clock(position)
+        # The mixer starts counting from zero again, which
+        # doesn't mean we went on to the next song.
+        self.last_position = 0
+        self.clear_end_events()
+        self.queued_file_name = None
+        if queued_file_name is not None:
+            self.queue(queued_file_name)
@@ -0,0 +1,227 @@
+import asyncio
+import collections
+import io
+import threading
+import urllib.parse
+from mpme_constants import MpmeConstants
+from mpme_mp3_frames import MpmeMp3Frames
+from mpme_samples import pg
+
+class MpmeStreamClient():
+    """ Class to play an MP3 stream from an HTTP (Icecast-style) server.
+        The stream comes in on one thread (running an asyncio loop) and
+        collects in a jitter buffer; another thread decodes it a little
+        ahead of time and hands it to the mixer a piece at a time. """
+
+    def __init__(self, url, volume):
+        """ Get ready to play the stream at the URL at
+            the given volume (from 0 to 100). """
+        self.url = url
+        self.volume = volume
+        # What the client is doing: "connecting", "buffering" or "playing"
+        self.state = "connecting"
+        # The bytes that came in but haven't been decoded yet
+        self.buffer = bytearray()
+        self.buffer_lock = threading.Lock()
+        # Until enough of the stream is buffered to ride out a hiccup in
+        # the network, we wait rather than play it as it trickles in.
+        self.prebuffering = True
+        # The last frame of the segment before, which the next segment's
+        # first frames may need to be decoded right (see decode)
+        self.lead_in = b""
+        self.stop_event = threading.Event()
+        # The asyncio loop receiving the stream and the task it runs, which
+        # are made (and closed) on the receiving thread but cancelled from
+        # whichever thread stops the client, so they have a lock.
+        self.loop = None
+        self.task = None
+        self.loop_lock = threading.Lock()
+        self.channel = None
+        self.threads = []
+
+    @staticmethod
+    def is_stream(preset):
+        """ Determine if a radio preset is a stream's URL
+            (rather than a frequency). """
+        return preset.startswith(("http://", "https://"))
+
+    @staticmethod
+    def name(url):
+        """ Return a short name for the stream at a URL, to show
+            on the preset buttons and the frequency display. """
+        return urllib.parse.urlsplit(url).hostname or url
+
+    def start(self):
+        """ Start playing the stream. (The mixer must be started.) """
+        self.threads = [threading.Thread(target=self.receive, daemon=True),
+                        threading.Thread(target=self.play, daemon=True)]
+        for thread in self.threads:
+            thread.start()
+
+    def stop(self):
+        """ Stop playing the stream and disconnect. """
+        self.stop_event.set()
+        with self.loop_lock:
+            if self.loop is not None:
+                self.loop.call_soon_threadsafe(self.task.cancel)
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+
+    def set_volume(self, volume):
+        """ Change the volume (from 0 to 100). """
+        self.volume = volume
+        if self.channel is not None:
+            self.channel.set_volume(volume / 100)
+
+    def receive(self):
+        """ Run the asyncio loop that receives the stream. """
+        with self.loop_lock:
+            loop = asyncio.new_event_loop()
+            task = loop.create_task(self.keep_receiving())
+            # (In case stop was called before there was a task to cancel)
+            if self.stop_event.is_set():
+                task.cancel()
+            self.loop, self.task = loop, task
+        try:
+            loop.run_until_complete(task)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            # (Once it's closed, there's nothing left for stop to cancel.)
+            with self.loop_lock:
+                self.loop, self.task = None, None
+                loop.close()
+
+    async def keep_receiving(self):
+        """ Receive the stream, and whenever the connection drops (or can't
+            be made) try again, waiting longer each time it fails. """
+        delay = MpmeConstants.STREAM_RETRY_MIN
+        while not self.stop_event.is_set():
+            try:
+                if await self.receive_once():
+                    # We got something, so start counting failures over.
+                    delay = MpmeConstants.STREAM_RETRY_MIN
+            except (OSError, ValueError, asyncio.TimeoutError):
+                pass
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, MpmeConstants.STREAM_RETRY_MAX)
+
+    async def receive_once(self):
+        """ Connect to the server and put the stream into the buffer until
+            the connection ends. Return True if any of the stream came in. """
+        url = urllib.parse.urlsplit(self.url)
+        secure = url.scheme == "https"
+        timeout = MpmeConstants.STREAM_TIMEOUT
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(
+            url.hostname, url.port or (443 if secure else 80),
+            ssl=True if secure else None), timeout)
+        received = False
+        try:
+            # Ask for the stream without Icecast's in-band titles. (HTTP 1.0
+            # means the server can't send it in chunks.)
+            path = url.path or "/"
+            if url.query:
+                path = path + "?" + url.query
+            writer.write(("GET " + path + " HTTP/1.0\r\n" +
+                          "Host: " + url.netloc + "\r\n" +
+                          "User-Agent: MPMe\r\n" +
+                          "Icy-MetaData: 0\r\n\r\n").encode("latin-1"))
+            await writer.drain()
+            # Both "HTTP/1.0 200 OK" and Icecast's "ICY 200 OK" will do.
+            status = (await asyncio.wait_for(reader.readline(),
+                                             timeout)).split()
+            if len(status) < 2 or status[1] != b"200":
+                raise ValueError("The server refused the stream.")
+            # Skip the headers.
+            while (await asyncio.wait_for(reader.readline(),
+                                          timeout)).strip():
+                pass
+            while not self.stop_event.is_set():
+                data = await asyncio.wait_for(
+                    reader.read(MpmeConstants.STREAM_READ_SIZE), timeout)
+                if not data:
+                    break # The server hung up.
+                received = True
+                with self.buffer_lock:
+                    self.buffer.extend(data)
+                    # If playing fell way behind, drop the oldest part.
+                    excess = len(self.buffer) - \
+                        MpmeConstants.STREAM_BUFFER_MAX
+                    if excess > 0:
+                        del self.buffer[:excess]
+        finally:
+            writer.close()
+        return received
+
+    def take_segment(self):
+        """ Take a few frames' worth of the stream (about STREAM_SEGMENT
+            seconds) out of the buffer and return them and how long they
+            play; or return None if not enough has come in yet - which,
+            if we're waiting for the buffer to fill, means at least
+            STREAM_PREBUFFER seconds. """
+        needed = MpmeConstants.STREAM_PREBUFFER if self.prebuffering \
+            else MpmeConstants.STREAM_SEGMENT
+        with self.buffer_lock:
+            seconds = 0
+            start = None
+            end = None
+            for offset, length, samples, sample_rate in \
+                    MpmeMp3Frames.frames(self.buffer):
+                if start is None:
+                    start = offset
+                seconds = seconds + samples / sample_rate
+                if end is None and seconds >= MpmeConstants.STREAM_SEGMENT:
+                    end = offset + length
+                    segment_seconds = seconds
+                    last_frame = offset
+                if seconds >= needed:
+                    break
+            if end is None or seconds < needed:
+                return None
+            segment = bytes(self.buffer[start:end])
+            lead_in = bytes(self.buffer[last_frame:end])
+            del self.buffer[:end]
+        self.prebuffering = False
+        return segment, segment_seconds, lead_in
+
+    def decode(self, segment, seconds, lead_in):
+        """ Decode a segment of the stream into a sound for the mixer.
+            An MP3 frame can lean on the frames before it, so the last
+            frame of the segment before goes in front, and whatever
+            the decoder makes of it gets cut back off. """
+        sound = pg.mixer.Sound(file=io.BytesIO(self.lead_in + segment))
+        self.lead_in = lead_in
+        rate, size, channels = pg.mixer.get_init()
+        frame_size = abs(size) // 8 * channels
+        raw = sound.get_raw()
+        excess = len(raw) - int(round(seconds * rate)) * frame_size
+        if excess <= 0:
+            return sound
+        return pg.mixer.Sound(buffer=raw[excess:])
+
+    def play(self):
+        """ Decode the stream a few segments ahead and hand the
+            segments to the mixer as it needs them, until stopped. """
+        decoded = collections.deque()
+        self.channel = pg.mixer.Channel(MpmeConstants.STREAM_CHANNEL)
+        self.channel.set_volume(self.volume / 100)
+        while not self.stop_event.is_set():
+            while len(decoded) < MpmeConstants.STREAM_DECODE_AHEAD:
+                segment = self.take_segment()
+                if segment is None:
+                    break
+                try:
+                    decoded.append(self.decode(*segment))
+                except pg.error:
+                    pass # A garbled bit of stream; skip it.
+            if decoded and self.channel.get_queue() is None:
+                self.channel.queue(decoded.popleft())
+                self.state = "playing"
+            elif not decoded and not self.channel.get_busy():
+                # We ran dry, so wait for the buffer to fill up again.
+                self.prebuffering = True
+                self.state = "buffering"
+            self.stop_event.wait(MpmeConstants.STREAM_SEGMENT / 4)
+        self.channel.stop()
+        self.channel = None
@@ -0,0 +1,83 @@
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from mpme_mp3_frames import MpmeMp3Frames
+
+class MpmeStreamServer(ThreadingHTTPServer):
+    """ A stand-in for an Icecast server, for trying out the radio's
+        stream presets: it serves an MP3 file over and over as one
+        endless stream, at the pace it plays. For example,
+            python mpme_stream_server.py song.mp3 8000
+        and then set a preset to http://localhost:8000/ """
+    daemon_threads = True
+    # How much of the stream (in seconds) to send right away when a
+    # client connects, as Icecast does, so it can start playing sooner
+    BURST = 2
+
+    def __init__(self, file_name, port=0, hang_up_after=None):
+        """ Get ready to serve the file on the given port (or any free one,
+            if it's 0). If hang_up_after is given, each connection gets
+            dropped after that many seconds, to try out reconnecting. """
+        ThreadingHTTPServer.__init__(self, ("localhost", port),
+                                     MpmeStreamHandler)
+        with open(file_name, "rb") as file_object:
+            data = file_object.read()
+        # Split the file into frames so we know how long each one plays.
+        self.frames = [(data[offset:offset + length], samples / sample_rate)
+                       for offset, length, samples, sample_rate in
+                       MpmeMp3Frames.frames(data)]
+        if not self.frames:
+            raise ValueError(file_name + " has no MP3 frames in it.")
+        self.hang_up_after = hang_up_after
+        self.thread = None
+
+    def url(self):
+        """ Return the stream's URL. """
+        return "http://localhost:" + str(self.server_address[1]) + "/"
+
+    def start(self):
+        """ Start serving in the background and return the stream's URL. """
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self.url()
+
+    def stop(self):
+        """ Stop serving. """
+        self.shutdown()
+        self.server_close()
+
+class MpmeStreamHandler(BaseHTTPRequestHandler):
+    """ Class to send the stream to one client """
+
+    def do_GET(self):
+        """ Send the file's frames, over and over, as they'd play. """
+        self.send_response(200)
+        self.send_header("Content-Type", "audio/mpeg")
+        self.end_headers()
+        started = time.monotonic()
+        sent = 0 # seconds of the stream sent so far
+        try:
+            while True:
+                for frame, seconds in self.server.frames:
+                    elapsed = time.monotonic() - started
+                    if self.server.hang_up_after is not None and \
+                       elapsed >= self.server.hang_up_after:
+                        return
+                    # Stay no more than the burst ahead of the listener.
+                    ahead = sent - elapsed - MpmeStreamServer.BURST
+                    if ahead > 0:
+                        time.sleep(ahead)
+                    self.wfile.write(frame)
+                    sent = sent + seconds
+        except (BrokenPipeError, ConnectionResetError):
+            pass # The client went away.
+
+    def log_message(self, format, *args):
+        """ Don't log every request. """
+
+if __name__ == '__main__':
+    server = MpmeStreamServer(sys.argv[1], int(sys.argv[2])
+                              if len(sys.argv) > 2 else 8000)
+    print("Streaming " + sys.argv[1] + " at " + server.url())
+    server.serve_forever()
@@ -0,0 +1,39 @@
+import threading
+import traceback
+from collections import OrderedDict
+
+class MpmeUiQueue():
+    """ Class to pass updates to the widgets from other threads to the
+        main loop, which is the only place tkinter may safely be used """
+
+    def __init__(self, root, interval):
+        """ Start applying the updates every "interval" milliseconds. """
+        self.root = root
+        self.interval = interval
+        # Updates waiting to be applied, keyed by what they update
+        self.pending = OrderedDict()
+        self.lock = threading.Lock()
+        self.root.after(self.interval, self.apply_updates)
+
+    def post(self, key, function, *args, **kwargs):
+        """ Have the main loop call function with the given arguments. If
+            an update with the same key (usually the widget it updates)
+            is still waiting, this one replaces it, so however many come
+            in, each widget gets redrawn at most once per batch. """
+        with self.lock:
+            self.pending.pop(key, None)
+            self.pending[key] = (function, args, kwargs)
+
+    def apply_updates(self):
+        """ Apply all the updates waiting (in the main loop), then
+            come back to apply the next batch. """
+        with self.lock:
+            updates = self.pending
+            self.pending = OrderedDict()
+        for function, args, kwargs in updates.values():
+            try:
+                function(*args, **kwargs)
+            except Exception:
+                # One update going wrong shouldn't stop all the others.
+                traceback.print_exc()
+        self.root.after(self.interval, self.apply_updates)
@@ -7,8 +7,21 @@ class PositionSlider(tk.Scale):
         """ Initialize the slider and bind the events for
             clicking, dragging, and releasing an item in it."""
         tk.Scale.__init__(self, master, kw)
+        self.bind('<Button-1>', self.button_down)
         self.bind('<ButtonRelease-1>', self.button_release)
+        self.dragging = False
+
+    def button_down(self, event):
+        """ Note that the user has hold of the slider. """
+        self.dragging = True
 
     def button_release(self, event):
+        """ Jump to wherever the user let go of the slider. """
+        self.dragging = False
         self.master.jump(self.get())
 
+    def show_position(self, percentage):
+        """ Move the slider to show the position in the song
+            (unless the user is busy dragging it somewhere). """
+        if not self.dragging:
+            self.set(min(percentage, 100))
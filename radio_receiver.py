@@ -1,32 +1,205 @@
+import bisect
+import math
+import os
+import threading
 from mpme_constants import MpmeConstants
+from mpme_samples import MpmeSamples, np, pg
 
 class RadioReceiver():
     """ Class to simulate a radio receiver """
 
+    # How quickly a station fades into static as the radio is tuned away
+    # from it: its signal strength is exp(-(distance / SIGNAL_WIDTH)^2),
+    # with the distance in tenths of a MHz.
+    SIGNAL_WIDTH = 2
+    # How loud the static and the stations are (out of 1)
+    STATIC_LEVEL = 0.3
+    STATION_LEVEL = 0.5
+
     def __init__(self, freq, volume):
         """ Start the receiver switched off with the set volume. """
         self.freq = freq
         self.volume = volume
+        # The thread that makes the radio's sound while it's on,
+        # and the mixer channel the sound goes to
+        self.thread = None
+        self.channel = None
+        self.stop_event = threading.Event()
+        # Set when the radio gets tuned, so the sound that was made
+        # ahead of time for the old frequency can be thrown away
+        self.retuned = threading.Event()
+        # The file of stations that are "broadcasting"
+        self.SIGNAL_FILE = os.path.join(MpmeConstants.ROOT_FOLDER +
+            MpmeConstants.SETTINGS_FOLDER, "receiving_stations.txt")
+        # The stations in the file, in tenths of a MHz (so 88.5 is 885)
+        # and in order, and the file's modification time when we read it.
+        # (The receiver gets asked from the scheduler's thread as well as
+        # the main one, so they take turns bringing the stations up to date.)
+        self.stations = []
+        self.stations_mtime = None
+        self.stations_lock = threading.Lock()
 
     def change_freq(self, freq):
         """ Change the radio frequency. """
         self.freq = freq
-        return False
+        self.retuned.set()
 
     def change_volume(self, volume):
-        """ Change the radio volume. """
+        """ Change the radio volume (from 0 to 100). """
         self.volume = volume
+        if self.channel is not None:
+            self.channel.set_volume(volume / 100)
+
+    def switch_on(self):
+        """ Start playing the radio's sound. (The mixer must be started.) """
+        if self.thread is not None:
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.play, daemon=True)
+        self.thread.start()
+
+    def switch_off(self):
+        """ Stop playing the radio's sound. """
+        if self.thread is None:
+            return
+        self.stop_event.set()
+        self.thread.join()
+        self.thread = None
+
+    @staticmethod
+    def tenths(freq):
+        """ Convert a frequency (like "88.5") to tenths of a MHz (885). """
+        return int(round(float(freq) * 10))
+
+    def station_list(self):
+        """ Return the stations that are "broadcasting", in tenths of a
+            MHz and in order - reading the file only if it changed. """
+        try:
+            mtime = os.stat(self.SIGNAL_FILE).st_mtime_ns
+        except OSError:
+            mtime = None # No file means no stations.
+        with self.stations_lock:
+            if mtime != self.stations_mtime:
+                self.stations = [] if mtime is None else self.read_stations()
+                self.stations_mtime = mtime
+            return self.stations
+
+    def read_stations(self):
+        """ Read the file of stations and return them in tenths
+            of a MHz, in order (skipping any lines that aren't
+            frequencies). """
+        stations = set()
+        try:
+            with open(self.SIGNAL_FILE) as file_object:
+                for line in file_object:
+                    try:
+                        stations.add(self.tenths(line))
+                    except ValueError:
+                        pass
+        except OSError:
+            pass
+        return sorted(stations)
 
     def receiving_signal(self, station):
         """ Determine if the radio is receiving a
             "signal" (really the simulation of one). """
-        SIGNAL_FILE = MpmeConstants.ROOT_FOLDER + \
-            MpmeConstants.SETTINGS_FOLDER + "\\receiving_stations.txt"
-        try:
-            with open(SIGNAL_FILE) as file_object:
-                for line in file_object:
-                    if line.rstrip('\n') == station:
-                        return True
-        except FileNotFoundError:
-            return False
-        return False                
+        stations = self.station_list()
+        station_tenths = self.tenths(station)
+        i = bisect.bisect_left(stations, station_tenths)
+        return i < len(stations) and stations[i] == station_tenths
+
+    def next_station(self, freq, direction, minimum, maximum):
+        """ Return the frequency of the next station that's "broadcasting"
+            going up (direction +1) or down (-1) from freq, wrapping around
+            from one end of the band (from minimum to maximum) to the other;
+            or None if no station in the band is. """
+        stations = self.station_list()
+        # Only look at the part of the list inside the band.
+        low = bisect.bisect_left(stations, self.tenths(minimum))
+        high = bisect.bisect_right(stations, self.tenths(maximum))
+        if low == high:
+            return None
+        freq_tenths = self.tenths(freq)
+        if direction > 0:
+            i = bisect.bisect_right(stations, freq_tenths, low, high)
+            station = stations[i] if i < high else stations[low]
+        else:
+            i = bisect.bisect_left(stations, freq_tenths, low, high)
+            station = stations[i - 1] if i > low else stations[high - 1]
+        return station / 10
+
+    def signal(self):
+        """ Return how strong a signal the radio is getting (from 0 to 1)
+            and the pitch (in Hz) of the nearest station's tune. """
+        stations = self.station_list()
+        if not stations:
+            return 0, 0
+        freq_tenths = self.tenths(self.freq)
+        i = bisect.bisect_left(stations, freq_tenths)
+        # The nearest station is either the one at or above the
+        # frequency or the one below it.
+        nearest = min(stations[max(i - 1, 0):i + 1],
+                      key=lambda station: abs(station - freq_tenths))
+        distance = abs(nearest - freq_tenths)
+        # Give each station its own note, somewhere in the octave over A3.
+        pitch = 220 * 2 ** ((nearest % 12) / 12)
+        return math.exp(-(distance / self.SIGNAL_WIDTH) ** 2), pitch
+
+    def make_block(self, start, length, rate, strengths, pitch):
+        """ Make "length" samples of the radio's sound (as numbers from -1
+            to 1) starting "start" samples in. The signal strength goes
+            smoothly from strengths[0] to strengths[1] over the block, so
+            the sound doesn't click when the radio is tuned. """
+        seconds = (start + np.arange(length)) / rate
+        strength = np.linspace(strengths[0], strengths[1], length,
+                               endpoint=False)
+        # Static: random noise, smoothed a little so it hisses
+        # rather than just screeching.
+        noise = self.random.standard_normal(length + 7)
+        static = np.convolve(noise, np.full(8, 1 / math.sqrt(8)), 'valid')
+        static = np.clip(static / 3, -1, 1) * self.STATIC_LEVEL
+        # The station: the note and the fifth above it,
+        # swelling and fading a couple of times a second
+        tune = (0.6 * np.sin(2 * np.pi * pitch * seconds) +
+                0.4 * np.sin(3 * np.pi * pitch * seconds)) * \
+               (0.75 + 0.25 * np.sin(2 * np.pi * 2 * seconds))
+        tune = tune * self.STATION_LEVEL
+        return strength * tune + (1 - strength) * static
+
+    def play(self):
+        """ Make the radio's sound a block at a time into a ring buffer
+            (running a few blocks ahead) and hand the blocks to the mixer
+            as it needs them, until the radio is switched off. """
+        rate, size, channels = pg.mixer.get_init()
+        block_length = rate * MpmeConstants.RADIO_BLOCK_MS // 1000
+        ring = np.zeros((MpmeConstants.RADIO_RING_BLOCKS, block_length))
+        first = 0  # where in the ring the oldest block is...
+        filled = 0 # ...and how many blocks there are
+        made = 0   # how many samples we've made (to keep the tunes in tune)
+        strength = 0
+        self.random = np.random.default_rng()
+        self.channel = pg.mixer.Channel(MpmeConstants.RADIO_CHANNEL)
+        self.channel.set_volume(self.volume / 100)
+        while not self.stop_event.is_set():
+            if self.retuned.is_set():
+                # Throw away what we made for the old frequency,
+                # so the new one can be heard right away.
+                self.retuned.clear()
+                filled = 0
+            # Top up the ring.
+            while filled < len(ring):
+                new_strength, pitch = self.signal()
+                ring[(first + filled) % len(ring)] = self.make_block(
+                    made, block_length, rate, (strength, new_strength), pitch)
+                strength = new_strength
+                made = made + block_length
+                filled = filled + 1
+            # Once the mixer's running out of sound, hand it the next block.
+            if self.channel.get_queue() is None:
+                self.channel.queue(pg.sndarray.make_sound(
+                    MpmeSamples.to_mixer_format(ring[first], size, channels)))
+                first = (first + 1) % len(ring)
+                filled = filled - 1
+            self.stop_event.wait(MpmeConstants.RADIO_BLOCK_MS / 4000)
+        self.channel.stop()
+        self.channel = None
@@ -0,0 +1,100 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from mpme_constants import MpmeConstants
+from mpme_mp3_frames import MpmeMp3Frames
+from mpme_stream_client import MpmeStreamClient
+from mpme_stream_server import MpmeStreamServer
+
+class TestMpmeStreamClient(unittest.TestCase):
+    """ Play the stand-in stream server to the stream client (without the
+        mixer, so just the receiving end) and check what comes in """
+
+    # An MPEG 1 Layer III frame header: 128 kbps, 44,100 Hz, no padding.
+    # Such a frame is 417 bytes long and plays 1,152 samples.
+    HEADER = b'\xff\xfb\x90\x00'
+    FRAME_LENGTH = 417
+    FRAME_COUNT = 100
+
+    def setUp(self):
+        """ Write a made-up MP3 file (frames of silence, each with its own
+            number in it, so they can be told apart) and serve it. """
+        self.frames = [self.HEADER + bytes([i]) +
+                       bytes(self.FRAME_LENGTH - len(self.HEADER) - 1)
+                       for i in range(self.FRAME_COUNT)]
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        self.file_name = os.path.join(folder.name, "stream.mp3")
+        with open(self.file_name, "wb") as file_object:
+            file_object.write(b''.join(self.frames))
+
+    def start(self, hang_up_after=None):
+        """ Start the server (on any free port) and a client receiving
+            from it, and return the client. """
+        server = MpmeStreamServer(self.file_name, 0, hang_up_after)
+        url = server.start()
+        self.addCleanup(server.stop)
+        client = MpmeStreamClient(url, 100)
+        client.threads = [threading.Thread(target=client.receive,
+                                           daemon=True)]
+        client.threads[0].start()
+        self.addCleanup(client.stop)
+        return client
+
+    def wait_for(self, condition, timeout=10):
+        """ Wait until the condition is true, or fail after the timeout. """
+        deadline = time.monotonic() + timeout
+        while not condition():
+            if time.monotonic() > deadline:
+                self.fail("Timed out")
+            time.sleep(0.05)
+
+    def buffered(self, client):
+        """ Return a copy of what the client has received so far. """
+        with client.buffer_lock:
+            return bytes(client.buffer)
+
+    def test_receives_the_frames_in_order(self):
+        """ The stream starts from the top of the file, frame by frame. """
+        client = self.start()
+        # (The server sends the first couple of seconds right away.)
+        self.wait_for(lambda: len(self.buffered(client)) >=
+                      50 * self.FRAME_LENGTH)
+        received = self.buffered(client)
+        self.assertEqual(received[:50 * self.FRAME_LENGTH],
+                         b''.join(self.frames[:50]))
+        offsets = [offset for offset, length, samples, sample_rate in
+                   MpmeMp3Frames.frames(received)]
+        self.assertEqual(offsets[:50],
+                         [i * self.FRAME_LENGTH for i in range(50)])
+
+    def test_takes_segments_once_prebuffered(self):
+        """ Nothing is taken until STREAM_PREBUFFER seconds are in, and
+            then segments of whole frames playing STREAM_SEGMENT seconds. """
+        client = self.start()
+        self.assertIsNone(client.take_segment())
+        segments = []
+        self.wait_for(lambda: segments.append(client.take_segment()) or
+                      segments[-1] is not None)
+        segment, seconds, lead_in = segments[-1]
+        frame_seconds = 1152 / 44100
+        self.assertGreaterEqual(seconds, MpmeConstants.STREAM_SEGMENT)
+        self.assertLess(seconds, MpmeConstants.STREAM_SEGMENT + frame_seconds)
+        frame_count = round(seconds / frame_seconds)
+        self.assertEqual(segment, b''.join(self.frames[:frame_count]))
+        self.assertEqual(lead_in, self.frames[frame_count - 1])
+
+    def test_reconnects_after_the_server_hangs_up(self):
+        """ When the connection drops, the client connects again and
+            the stream picks up from the top of the file. """
+        client = self.start(hang_up_after=0.5)
+        first_frame = self.frames[0]
+        # The second connection starts the file over, so the first
+        # frame comes in again after the first connection's frames.
+        self.wait_for(lambda: self.buffered(client).find(
+            first_frame, self.FRAME_LENGTH) > 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,203 @@
+import tkinter as tk
+import drag_drop_listbox
+
+class VirtualListbox(drag_drop_listbox.DragDropListbox):
+    """ A drag'n'drop listbox that keeps all its entries in a plain list
+        and only puts the ones that fit in the window into the widget, so
+        folders with many thousands of entries load instantly. """
+    # How often (in milliseconds) to scroll a row while an entry is
+    # dragged past the top or bottom (as often as Tk's own listbox does)
+    DRAG_SCROLL_MS = 50
+
+    def __init__(self, master, file_display, **kw):
+        """ Initialize the listbox with no entries. """
+        # We report the scroll position ourselves, since
+        # the widget only ever holds the visible rows.
+        self.yscrollcommand = kw.pop('yscrollcommand', None)
+        drag_drop_listbox.DragDropListbox.__init__(
+            self, master, file_display, **kw)
+        self.rows = []      # all the entries
+        self.top = 0        # the index of the first visible entry
+        self.selected = None # the index of the selected entry, if any
+        self.bind('<MouseWheel>', self.wheel)
+        self.bind('<Button-4>', lambda event: self.scroll_to(self.top - 1))
+        self.bind('<Button-5>', lambda event: self.scroll_to(self.top + 1))
+        # The widget's own keys would only move within the visible rows,
+        # so the keys that change the selection work on the whole list.
+        self.bind('<Up>', lambda event: self.key_select(-1))
+        self.bind('<Down>', lambda event: self.key_select(1))
+        self.bind('<Prior>', lambda event: self.key_select(
+            -self.visible_rows()))
+        self.bind('<Next>', lambda event: self.key_select(
+            self.visible_rows()))
+        self.bind('<Home>', lambda event: self.key_select(-len(self.rows)))
+        self.bind('<End>', lambda event: self.key_select(len(self.rows)))
+        # ...and whatever else selects a row, we keep track of it.
+        self.bind('<<ListboxSelect>>', self.sync_selection)
+        # Which way (-1 for up, 1 for down, or 0) we're scrolling
+        # while an entry is being dragged past the top or bottom
+        self.drag_direction = 0
+        self.drag_job = None
+        self.bind('<ButtonRelease-1>', self.stop_drag_scroll, add='+')
+
+    def visible_rows(self):
+        """ Return how many rows fit in the listbox. """
+        return int(self.cget('height'))
+
+    def render(self):
+        """ Put the visible entries into the widget and
+            bring the scrollbar up to date. """
+        self.delete(0, tk.END)
+        self.insert(0, *self.rows[self.top:self.top + self.visible_rows()])
+        if self.selected is not None and \
+           self.top <= self.selected < self.top + self.visible_rows():
+            self.select_set(self.selected - self.top)
+        if self.yscrollcommand is not None:
+            self.yscrollcommand(*self.yview())
+
+    def set_rows(self, rows):
+        """ Replace all the entries at once. """
+        self.rows = list(rows)
+        self.top = 0
+        self.selected = None
+        self.order_changed = False
+        self.render()
+
+    def update_rows(self, rows):
+        """ Replace all the entries but stay where we are
+            and keep the same entry selected, if it's still there. """
+        selected_entry = self.selected_entry()
+        self.rows = list(rows)
+        if selected_entry in self.rows:
+            self.selected = self.rows.index(selected_entry)
+        else:
+            self.selected = None
+        self.scroll_to(self.top)
+
+    def get_rows(self):
+        """ Return all the entries. """
+        return self.rows
+
+    def row(self, index):
+        """ Return the entry at the given index. """
+        return self.rows[index]
+
+    def selected_row(self):
+        """ Return the index of the selected entry (or None). """
+        return self.selected
+
+    def selected_entry(self):
+        """ Return the selected entry (or None). """
+        if self.selected is None:
+            return None
+        return self.rows[self.selected]
+
+    def select_row(self, index):
+        """ Select the entry at the given index. """
+        self.selected = index
+        self.render()
+
+    def see_row(self, index):
+        """ Scroll so the entry at the given index is visible. """
+        if index < self.top:
+            self.scroll_to(index)
+        elif index >= self.top + self.visible_rows():
+            self.scroll_to(index - self.visible_rows() + 1)
+
+    def scroll_to(self, top):
+        """ Make the entry at the given index the first one visible. """
+        self.top = max(0, min(top, len(self.rows) - self.visible_rows()))
+        self.render()
+
+    def yview(self, *args):
+        """ Scroll the way the scrollbar asks us to, or (with no arguments)
+            return the visible part of the list as fractions of the whole. """
+        if not args:
+            if not self.rows:
+                return (0.0, 1.0)
+            return (self.top / len(self.rows),
+                    min(1.0, (self.top + self.visible_rows()) /
+                        len(self.rows)))
+        if args[0] == 'moveto':
+            self.scroll_to(int(float(args[1]) * len(self.rows)))
+        elif args[0] == 'scroll':
+            amount = int(args[1])
+            if args[2] == 'pages':
+                amount = amount * self.visible_rows()
+            self.scroll_to(self.top + amount)
+
+    def wheel(self, event):
+        """ Scroll with the mouse wheel. """
+        self.scroll_to(self.top - event.delta // 120)
+
+    def key_select(self, step):
+        """ Move the selection the given number of entries up (if it's
+            negative) or down, staying within the list, and scroll to it. """
+        if self.rows:
+            if self.selected is None:
+                self.selected = self.top
+            else:
+                self.selected = max(0, min(self.selected + step,
+                                           len(self.rows) - 1))
+            self.see_row(self.selected)
+            self.render()
+        return 'break' # (Don't let the widget move it too.)
+
+    def sync_selection(self, event):
+        """ Note which entry got selected in the widget. """
+        selection = self.curselection()
+        if selection:
+            self.selected = self.top + selection[0]
+
+    def setCurrent(self, event):
+        """ Note (and select) the entry on which the user just clicked. """
+        self.curIndex = self.top + self.nearest(event.y)
+        self.clickedWithoutDragging = True
+        if self.curIndex < len(self.rows):
+            self.selected = self.curIndex
+
+    def shiftSelection(self, event):
+        """ Move an entry to the place the user is dragging it. If that's
+            past the top or bottom of the listbox, keep scrolling that
+            way (taking the entry along) until it's back inside. """
+        self.clickedWithoutDragging = False
+        if event.y < 0:
+            self.drag_direction = -1
+        elif event.y >= self.winfo_height():
+            self.drag_direction = 1
+        else:
+            self.drag_direction = 0
+            self.move_dragged(self.top + self.nearest(event.y))
+        if self.drag_direction != 0 and self.drag_job is None:
+            self.drag_scroll()
+
+    def drag_scroll(self):
+        """ Scroll a row while an entry is dragged past the
+            top or bottom, and move the entry to that edge. """
+        self.drag_job = None
+        if self.drag_direction == 0:
+            return
+        self.scroll_to(self.top + self.drag_direction)
+        if self.drag_direction < 0:
+            self.move_dragged(self.top)
+        else:
+            self.move_dragged(min(self.top + self.visible_rows(),
+                                  len(self.rows)) - 1)
+        self.drag_job = self.after(self.DRAG_SCROLL_MS, self.drag_scroll)
+
+    def stop_drag_scroll(self, event):
+        """ Stop scrolling when the user lets go of the entry. """
+        self.drag_direction = 0
+        if self.drag_job is not None:
+            self.after_cancel(self.drag_job)
+            self.drag_job = None
+
+    def move_dragged(self, i):
+        """ Move the entry being dragged to the given index. """
+        if i != self.curIndex and self.curIndex < len(self.rows) and \
+           0 <= i < len(self.rows):
+            self.rows.insert(i, self.rows.pop(self.curIndex))
+            self.curIndex = i
+            self.selected = i
+            self.order_changed = True
+            self.render()